@@ -0,0 +1,30 @@
+"""add embedding cache
+
+Revision ID: a6d8f0b2c4e5
+Revises: f4c6e8a0b2d3
+Create Date: 2026-02-16 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+revision = 'a6d8f0b2c4e5'
+down_revision = 'f4c6e8a0b2d3'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'embedding_cache',
+        sa.Column('model_id', sa.String(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('embedding', Vector(384), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.PrimaryKeyConstraint('model_id', 'content_hash'),
+    )
+    op.add_column('ingestion_jobs', sa.Column('chunks_cached', sa.Integer(), nullable=True, server_default='0'))
+
+def downgrade() -> None:
+    op.drop_column('ingestion_jobs', 'chunks_cached')
+    op.drop_table('embedding_cache')
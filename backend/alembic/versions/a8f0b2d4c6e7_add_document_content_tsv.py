@@ -0,0 +1,39 @@
+"""add document content tsv
+
+Revision ID: a8f0b2d4c6e7
+Revises: f6d8a0c2e4b5
+Create Date: 2026-03-30 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = 'a8f0b2d4c6e7'
+down_revision = 'f6d8a0c2e4b5'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Stored generated column, filled for existing rows by the table rewrite.
+    # The 'english' configuration drops stop words, so ORing a question's
+    # terms does not match most of the project; codes such as AB-123 are
+    # not stemmed and still match as typed.
+    op.add_column(
+        'documents',
+        sa.Column(
+            'content_tsv',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('english', content)", persisted=True),
+        ),
+    )
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_content_tsv "
+            "ON documents USING gin (content_tsv)"
+        )
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_content_tsv")
+    op.drop_column('documents', 'content_tsv')
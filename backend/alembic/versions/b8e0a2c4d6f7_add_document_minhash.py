@@ -0,0 +1,30 @@
+"""add document minhash signatures
+
+Revision ID: b8e0a2c4d6f7
+Revises: a6d8f0b2c4e5
+Create Date: 2026-02-23 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = 'b8e0a2c4d6f7'
+down_revision = 'a6d8f0b2c4e5'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('minhash', sa.LargeBinary(), nullable=True))
+    op.add_column('documents', sa.Column('lsh_bands', postgresql.ARRAY(sa.BigInteger()), nullable=True))
+    op.add_column('ingestion_jobs', sa.Column('chunks_suppressed', sa.Integer(), nullable=True, server_default='0'))
+    with op.get_context().autocommit_block():
+        # Candidate lookup uses lsh_bands && ARRAY[...]
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_lsh_bands ON documents USING gin (lsh_bands)")
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_lsh_bands")
+    op.drop_column('ingestion_jobs', 'chunks_suppressed')
+    op.drop_column('documents', 'lsh_bands')
+    op.drop_column('documents', 'minhash')
@@ -0,0 +1,23 @@
+"""add bulk ingestion job fields
+
+Revision ID: c0f2b4d6e8a9
+Revises: b8e0a2c4d6f7
+Create Date: 2026-03-02 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = 'c0f2b4d6e8a9'
+down_revision = 'b8e0a2c4d6f7'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('ingestion_jobs', sa.Column('kind', sa.String(), nullable=False, server_default='document'))
+    op.add_column('ingestion_jobs', sa.Column('results', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column('ingestion_jobs', 'results')
+    op.drop_column('ingestion_jobs', 'kind')
@@ -0,0 +1,78 @@
+"""partition documents by project
+
+Revision ID: c2e4a6b8d0f1
+Revises: a8f0b2d4c6e7
+Create Date: 2026-04-06 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.core.config import settings
+from app.db.partitions import document_partition
+
+revision = 'c2e4a6b8d0f1'
+down_revision = 'a8f0b2d4c6e7'
+branch_labels = None
+depends_on = None
+
+_COLUMNS = """
+    id uuid NOT NULL,
+    project_id uuid NOT NULL REFERENCES projects (id),
+    content text NOT NULL,
+    content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', content)) STORED,
+    metadata jsonb,
+    embedding vector(384),
+    content_hash varchar(64),
+    minhash bytea,
+    lsh_bands bigint[],
+    created_at timestamp without time zone
+"""
+_COPIED = "id, project_id, content, metadata, embedding, content_hash, minhash, lsh_bands, created_at"
+
+def _create_indexes() -> None:
+    # On the partitioned table, each index is built on every partition and
+    # on partitions created later
+    build = f"WITH (m = {int(settings.VECTOR_HNSW_M)}, ef_construction = {int(settings.VECTOR_HNSW_EF_CONSTRUCTION)})"
+    # HNSW only: ivfflat lists cascaded onto an empty partition stay untrained
+    op.execute("CREATE INDEX ix_documents_embedding_ann ON documents USING hnsw (embedding vector_l2_ops) " + build)
+    if settings.RAG_QUANTIZATION == "halfvec":
+        op.execute(
+            "CREATE INDEX ix_documents_embedding_halfvec "
+            "ON documents USING hnsw ((embedding::halfvec(384)) halfvec_l2_ops) " + build
+        )
+    elif settings.RAG_QUANTIZATION == "binary":
+        op.execute(
+            "CREATE INDEX ix_documents_embedding_bit "
+            "ON documents USING hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops) " + build
+        )
+    op.execute("CREATE INDEX ix_documents_project_id ON documents (project_id)")
+    op.execute("CREATE INDEX ix_documents_project_source ON documents (project_id, (metadata->>'source'))")
+    op.execute("CREATE INDEX ix_documents_lsh_bands ON documents USING gin (lsh_bands)")
+    op.execute("CREATE INDEX ix_documents_metadata ON documents USING gin (metadata jsonb_path_ops)")
+    op.execute("CREATE INDEX ix_documents_content_tsv ON documents USING gin (content_tsv)")
+
+def upgrade() -> None:
+    # Rewrites documents under an exclusive lock: run it in a maintenance
+    # window. Rows are copied before the indexes are built, which is much
+    # faster than maintaining them during the copy.
+    op.execute("ALTER TABLE documents RENAME TO documents_unpartitioned")
+    op.execute("ALTER TABLE documents_unpartitioned RENAME CONSTRAINT documents_pkey TO documents_unpartitioned_pkey")
+    # The partition key must be part of the primary key
+    op.execute(f"CREATE TABLE documents ({_COLUMNS}, PRIMARY KEY (id, project_id)) PARTITION BY LIST (project_id)")
+    # No default partition: it would make attaching a partition scan it and
+    # rule out detaching concurrently. New projects get theirs from
+    # app/db/partitions.py
+    for (project_id,) in op.get_bind().execute(sa.text("SELECT id FROM projects")):
+        op.execute(f"CREATE TABLE {document_partition(project_id)} PARTITION OF documents FOR VALUES IN ('{project_id}')")
+    op.execute(f"INSERT INTO documents ({_COPIED}) SELECT {_COPIED} FROM documents_unpartitioned")
+    op.execute("DROP TABLE documents_unpartitioned")
+    _create_indexes()
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE documents RENAME TO documents_partitioned")
+    op.execute("ALTER TABLE documents_partitioned RENAME CONSTRAINT documents_pkey TO documents_partitioned_pkey")
+    op.execute(f"CREATE TABLE documents ({_COLUMNS}, PRIMARY KEY (id))")
+    op.execute(f"INSERT INTO documents ({_COPIED}) SELECT {_COPIED} FROM documents_partitioned")
+    # Drops every partition with it
+    op.execute("DROP TABLE documents_partitioned")
+    _create_indexes()
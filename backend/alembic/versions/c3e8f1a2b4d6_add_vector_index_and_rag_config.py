@@ -0,0 +1,46 @@
+"""add vector index and project rag config
+
+Revision ID: c3e8f1a2b4d6
+Revises: a1b2c3d4e5f6
+Create Date: 2026-01-12 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from app.core.config import settings
+
+revision = 'c3e8f1a2b4d6'
+down_revision = 'a1b2c3d4e5f6'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column(
+        'projects',
+        sa.Column('rag_config', postgresql.JSONB(astext_type=sa.Text()), nullable=True, server_default=sa.text("'{}'::jsonb")),
+    )
+
+    # Index builds can take a long time on large tables, build them without
+    # blocking ingestion. HNSW requires pgvector >= 0.5.0.
+    if settings.VECTOR_INDEX_TYPE == "ivfflat":
+        ann_index = (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_embedding_ann "
+            "ON documents USING ivfflat (embedding vector_l2_ops) "
+            f"WITH (lists = {int(settings.VECTOR_IVFFLAT_LISTS)})"
+        )
+    else:
+        ann_index = (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_embedding_ann "
+            "ON documents USING hnsw (embedding vector_l2_ops) "
+            f"WITH (m = {int(settings.VECTOR_HNSW_M)}, ef_construction = {int(settings.VECTOR_HNSW_EF_CONSTRUCTION)})"
+        )
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_project_id ON documents (project_id)")
+        op.execute(ann_index)
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_embedding_ann")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_project_id")
+    op.drop_column('projects', 'rag_config')
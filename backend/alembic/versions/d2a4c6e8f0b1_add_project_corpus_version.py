@@ -0,0 +1,20 @@
+"""add project corpus version
+
+Revision ID: d2a4c6e8f0b1
+Revises: c0f2b4d6e8a9
+Create Date: 2026-03-09 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'd2a4c6e8f0b1'
+down_revision = 'c0f2b4d6e8a9'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('projects', sa.Column('corpus_version', sa.Integer(), nullable=False, server_default='0'))
+
+def downgrade() -> None:
+    op.drop_column('projects', 'corpus_version')
@@ -0,0 +1,34 @@
+"""add answer cache entries
+
+Revision ID: d7a9b2c4e6f1
+Revises: c3e8f1a2b4d6
+Create Date: 2026-01-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from pgvector.sqlalchemy import Vector
+
+revision = 'd7a9b2c4e6f1'
+down_revision = 'c3e8f1a2b4d6'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'answer_cache_entries',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('project_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('projects.id'), nullable=False),
+        sa.Column('question', sa.Text(), nullable=False),
+        sa.Column('answer', sa.Text(), nullable=False),
+        sa.Column('embedding', Vector(384), nullable=True),
+        sa.Column('prompt_hash', sa.String(), nullable=False),
+        sa.Column('hits', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=True, server_default=sa.text('CURRENT_TIMESTAMP')),
+    )
+    op.create_index('ix_answer_cache_entries_project_id', 'answer_cache_entries', ['project_id'])
+
+def downgrade() -> None:
+    op.drop_index('ix_answer_cache_entries_project_id', table_name='answer_cache_entries')
+    op.drop_table('answer_cache_entries')
@@ -0,0 +1,39 @@
+"""add ingestion jobs
+
+Revision ID: e2b4c6d8f0a1
+Revises: d7a9b2c4e6f1
+Create Date: 2026-02-02 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = 'e2b4c6d8f0a1'
+down_revision = 'd7a9b2c4e6f1'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'ingestion_jobs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('project_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('projects.id'), nullable=False),
+        sa.Column('status', sa.String(), nullable=False, server_default='queued'),
+        sa.Column('source', sa.String(), nullable=True),
+        sa.Column('metadata', postgresql.JSONB(astext_type=sa.Text()), nullable=True, server_default=sa.text("'{}'::jsonb")),
+        sa.Column('payload_path', sa.String(), nullable=True),
+        sa.Column('chunks_total', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('chunks_embedded', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('chunks_inserted', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_ingestion_jobs_project_id', 'ingestion_jobs', ['project_id'])
+
+def downgrade() -> None:
+    op.drop_index('ix_ingestion_jobs_project_id', table_name='ingestion_jobs')
+    op.drop_table('ingestion_jobs')
@@ -0,0 +1,37 @@
+"""add quantized vector indexes
+
+Revision ID: e4b6d8f0a2c3
+Revises: d2a4c6e8f0b1
+Create Date: 2026-03-16 09:00:00.000000
+
+"""
+from alembic import op
+from app.core.config import settings
+
+revision = 'e4b6d8f0a2c3'
+down_revision = 'd2a4c6e8f0b1'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Expression indexes over the full-precision column, which stays the
+    # source of truth for re-ranking. Only the index for the configured
+    # RAG_QUANTIZATION is built; halfvec and binary_quantize require
+    # pgvector >= 0.7.0.
+    build = f"WITH (m = {int(settings.VECTOR_HNSW_M)}, ef_construction = {int(settings.VECTOR_HNSW_EF_CONSTRUCTION)})"
+    with op.get_context().autocommit_block():
+        if settings.RAG_QUANTIZATION == "halfvec":
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_embedding_halfvec "
+                "ON documents USING hnsw ((embedding::halfvec(384)) halfvec_l2_ops) " + build
+            )
+        elif settings.RAG_QUANTIZATION == "binary":
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_embedding_bit "
+                "ON documents USING hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops) " + build
+            )
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_embedding_bit")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_embedding_halfvec")
@@ -0,0 +1,41 @@
+"""add document content hash and sync ingestion
+
+Revision ID: f4c6e8a0b2d3
+Revises: e2b4c6d8f0a1
+Create Date: 2026-02-09 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'f4c6e8a0b2d3'
+down_revision = 'e2b4c6d8f0a1'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    # Same normalization as app.services.chunking.content_hash
+    op.execute(
+        "UPDATE documents SET content_hash = encode(sha256(convert_to("
+        "btrim(regexp_replace(content, '[ \\t\\n\\r\\f\\v]+', ' ', 'g'), ' '), 'UTF8')), 'hex')"
+    )
+
+    op.add_column('ingestion_jobs', sa.Column('mode', sa.String(), nullable=False, server_default='append'))
+    op.add_column('ingestion_jobs', sa.Column('chunks_unchanged', sa.Integer(), nullable=True, server_default='0'))
+    op.add_column('ingestion_jobs', sa.Column('chunks_deleted', sa.Integer(), nullable=True, server_default='0'))
+
+    with op.get_context().autocommit_block():
+        # Sync ingestion loads a source's chunks by (project_id, metadata->>'source')
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_project_source "
+            "ON documents (project_id, (metadata->>'source'))"
+        )
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_project_source")
+    op.drop_column('ingestion_jobs', 'chunks_deleted')
+    op.drop_column('ingestion_jobs', 'chunks_unchanged')
+    op.drop_column('ingestion_jobs', 'mode')
+    op.drop_column('documents', 'content_hash')
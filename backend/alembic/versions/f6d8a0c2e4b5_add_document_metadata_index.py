@@ -0,0 +1,26 @@
+"""add document metadata index
+
+Revision ID: f6d8a0c2e4b5
+Revises: e4b6d8f0a2c3
+Create Date: 2026-03-23 09:00:00.000000
+
+"""
+from alembic import op
+
+revision = 'f6d8a0c2e4b5'
+down_revision = 'e4b6d8f0a2c3'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # jsonb_path_ops serves the @> containment used by retrieval metadata
+    # filters and is smaller than the default jsonb_ops
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_metadata "
+            "ON documents USING gin (metadata jsonb_path_ops)"
+        )
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_metadata")
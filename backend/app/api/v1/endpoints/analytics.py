@@ -6,6 +6,10 @@ from app.db.session import get_db
 from app.models.all_models import ChatSession, ChatMessage
 from typing import Optional
 from app.api.deps import get_current_admin
+from app.services.rag_service import rag_service
+from app.services.embeddings_factory import embeddings_stats
+from app.services.ingestion_jobs import ingestion_jobs
+from app.services.chat_writer import chat_writer
 import sentry_sdk
 
 # Simple in-memory cache with TTL for analytics responses
@@ -175,3 +179,18 @@ async def latency_trend(
         avg = int(sum(vals) / len(vals)) if vals else 0
         trend.append({"day": day, "ms": avg})
     return {"trend": trend}
+
+@router.get("/runtime")
+async def runtime_metrics(
+    admin: str = Depends(get_current_admin),
+):
+    """
+    In-process cache and queue counters of this worker.
+    """
+    return {
+        "query_embedding_cache": rag_service.cache_stats(),
+        "retrieval_cache": rag_service.retrieval_cache_stats(),
+        "embedding_batcher": embeddings_stats(),
+        "ingestion_jobs": ingestion_jobs.stats(),
+        "chat_write_buffer": chat_writer.stats(),
+    }
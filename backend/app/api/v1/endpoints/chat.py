@@ -1,11 +1,14 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, UploadFile, File
 from uuid import UUID
 from app.services.chat_service import chat_service
+from app.services.rag_service import metadata_conditions
 from app.db.session import AsyncSessionLocal, get_db
 from app.schemas.chat import ChatFeedbackRequest
+from app.core.config import settings
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models.all_models import ChatMessage
+import codecs
 import logging
 import json
 from urllib.parse import urlparse
@@ -59,25 +62,35 @@ async def upload_file(
     if not file:
         raise HTTPException(status_code=400, detail="No file uploaded")
     
-    content = ""
+    limit = settings.CHAT_UPLOAD_MAX_BYTES
+    if file.size and file.size > limit:
+        raise HTTPException(status_code=400, detail="File too large")
+
+    # Read and decode the spooled upload incrementally, stopping at the limit
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parts = []
+    received = 0
     try:
-        # Simple text extraction for now
-        # Limit size to 5MB
-        if file.size and file.size > 5 * 1024 * 1024:
-             raise HTTPException(status_code=400, detail="File too large")
-             
-        file_content = await file.read()
-        try:
-            content = file_content.decode("utf-8")
-        except UnicodeDecodeError:
-            # Try to handle as PDF if needed, but requires external lib.
-            # For now, just error on binary
-            raise HTTPException(status_code=400, detail="Only text files are supported currently")
-            
+        while True:
+            block = await file.read(64 * 1024)
+            if not block:
+                break
+            received += len(block)
+            if received > limit:
+                raise HTTPException(status_code=400, detail="File too large")
+            parts.append(decoder.decode(block))
+        parts.append(decoder.decode(b"", final=True))
+    except UnicodeDecodeError:
+        # Try to handle as PDF if needed, but requires external lib.
+        # For now, just error on binary
+        raise HTTPException(status_code=400, detail="Only text files are supported currently")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing file: {e}")
         raise HTTPException(status_code=500, detail="Error processing file")
-        
+    content = "".join(parts)
+
     return {"filename": file.filename, "content": content}
 
 @router.websocket("/{project_id}/ws")
@@ -144,25 +157,31 @@ async def websocket_endpoint(
                 payload = json.loads(data)
                 message = payload.get("message")
                 session_id = payload.get("session_id")
+                filters = payload.get("filters")
                 
                 if not message:
                     await websocket.send_json({"type": "error", "error": "Message is required"})
                     continue
 
+                try:
+                    metadata_conditions(filters)
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "error": f"Invalid filters: {e}"})
+                    continue
+
                 # Rate Limit Check
                 client_ip = websocket.client.host if websocket.client else "unknown"
                 if not check_rate_limit(client_ip):
                     await websocket.send_json({"type": "error", "error": "Rate limit exceeded"})
                     continue
 
-                # Create a new DB session for this request
-                async with AsyncSessionLocal() as db:
-                    # Stream response
-                    async for chunk in chat_service.process_message(db, project_id, message, session_id):
-                        await websocket.send_json({
-                            "type": "token",
-                            "content": chunk
-                        })
+                # Stream response; the turn opens short-lived DB sessions
+                # itself, so no connection is held while tokens stream
+                async for chunk in chat_service.process_message(project_id, message, session_id, filters):
+                    await websocket.send_json({
+                        "type": "token",
+                        "content": chunk
+                    })
                 
                 # Signal completion
                 await websocket.send_json({"type": "done"})
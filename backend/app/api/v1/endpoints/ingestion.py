@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
+from datetime import datetime
 import logging
 
 from app.db.session import get_db
-from app.services.ingestion_service import ingestion_service
-from app.schemas.document import IngestTextRequest, IngestResponse
-from app.models.all_models import Project
+from app.services.ingestion_jobs import ingestion_jobs
+from app.services.bulk_ingestion import bulk_format
+from app.schemas.document import IngestTextRequest, IngestJobResponse, IngestJobStatus
+from app.models.all_models import Project, IngestionJob
 from app.api.deps import get_current_project
 from app.core.limiter import limiter
 from starlette.requests import Request
@@ -14,7 +16,7 @@ from starlette.requests import Request
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.post("/{project_id}/text", response_model=IngestResponse)
+@router.post("/{project_id}/text", response_model=IngestJobResponse, status_code=202)
 @limiter.limit("10/minute")
 async def ingest_text(
     request: Request,
@@ -24,38 +26,48 @@ async def ingest_text(
     project: Project = Depends(get_current_project)
 ):
     """
-    Ingest raw text into the project's knowledge base.
+    Queue raw text for ingestion into the project's knowledge base.
+    Returns a job id; poll GET /ingest/jobs/{job_id} for progress.
     Requires API Key.
     """
     if project.id != project_id:
         raise HTTPException(status_code=403, detail="API Key does not match Project ID")
 
+    if ingest_request.mode == "sync" and not (ingest_request.metadata or {}).get("source"):
+        raise HTTPException(status_code=400, detail="Sync mode requires metadata.source")
+
     try:
-        count = await ingestion_service.ingest_text(
+        job = await ingestion_jobs.submit_text(
             db=db,
             project_id=project_id,
             text=ingest_request.text,
-            metadata=ingest_request.metadata
+            metadata=ingest_request.metadata,
+            mode=ingest_request.mode
         )
-        return IngestResponse(
-            documents_processed=count,
-            message="Text successfully ingested"
+        return IngestJobResponse(
+            job_id=job.id,
+            status=job.status,
+            message="Text queued for ingestion"
         )
     except Exception as e:
-        logger.error(f"Error ingesting text: {e}")
+        logger.error(f"Error queueing text ingestion: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/{project_id}/file", response_model=IngestResponse)
+@router.post("/{project_id}/file", response_model=IngestJobResponse, status_code=202)
 @limiter.limit("5/minute")
 async def ingest_file(
     request: Request,
     project_id: UUID,
     file: UploadFile = File(...),
+    mode: str = Form("append"),
     db: AsyncSession = Depends(get_db),
     project: Project = Depends(get_current_project)
 ):
     """
-    Ingest a file (PDF or Text) into the project's knowledge base.
+    Queue a file (PDF or Text) for ingestion into the project's knowledge base.
+    mode=sync replaces the chunks previously ingested from the same filename,
+    embedding only chunks that changed.
+    Returns a job id; poll GET /ingest/jobs/{job_id} for progress.
     Requires API Key.
     """
     if project.id != project_id:
@@ -64,25 +76,113 @@ async def ingest_file(
     if not file.filename.endswith(('.txt', '.pdf', '.md')):
         raise HTTPException(status_code=400, detail="Only .txt, .pdf, and .md files are supported")
 
-    content = await file.read()
-    
-    # Simple text decoding for now. PDF support would need pypdf
+    if mode not in ("append", "sync"):
+        raise HTTPException(status_code=400, detail="mode must be 'append' or 'sync'")
+
     try:
-        text_content = content.decode('utf-8')
-    except UnicodeDecodeError:
-        raise HTTPException(status_code=400, detail="Could not decode file as UTF-8 text")
+        job = await ingestion_jobs.submit_file(
+            db=db,
+            project_id=project_id,
+            file=file.file,
+            metadata={"source": file.filename},
+            mode=mode,
+            kind="pdf" if file.filename.endswith(".pdf") else "document"
+        )
+        return IngestJobResponse(
+            job_id=job.id,
+            status=job.status,
+            message=f"File {file.filename} queued for ingestion"
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error queueing file ingestion: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/{project_id}/bulk", response_model=IngestJobResponse, status_code=202)
+@limiter.limit("5/minute")
+async def ingest_bulk(
+    request: Request,
+    project_id: UUID,
+    file: UploadFile = File(...),
+    mode: str = Form("append"),
+    db: AsyncSession = Depends(get_db),
+    project: Project = Depends(get_current_project)
+):
+    """
+    Queue many documents at once: a JSONL file (one {"text", "metadata"}
+    object per line) or a zip of .txt/.md files. The whole upload is one
+    job and one rate-limit hit; per-item results are on the job status.
+    Requires API Key.
+    """
+    if project.id != project_id:
+        raise HTTPException(status_code=403, detail="API Key does not match Project ID")
+
+    fmt = bulk_format(file.filename or "")
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="Only .jsonl, .ndjson and .zip files are supported")
+
+    if mode not in ("append", "sync"):
+        raise HTTPException(status_code=400, detail="mode must be 'append' or 'sync'")
 
     try:
-        count = await ingestion_service.ingest_text(
+        job = await ingestion_jobs.submit_file(
             db=db,
             project_id=project_id,
-            text=text_content,
-            metadata={"source": file.filename}
+            file=file.file,
+            metadata={"source": file.filename},
+            mode=mode,
+            kind=fmt
         )
-        return IngestResponse(
-            documents_processed=count,
-            message=f"File {file.filename} successfully ingested"
+        return IngestJobResponse(
+            job_id=job.id,
+            status=job.status,
+            message=f"Bulk file {file.filename} queued for ingestion"
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error ingesting file: {e}")
+        logger.error(f"Error queueing bulk ingestion: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}", response_model=IngestJobStatus)
+async def get_ingestion_job(
+    job_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    project: Project = Depends(get_current_project)
+):
+    """
+    Progress of an ingestion job: chunks embedded and inserted, throughput and errors.
+    Requires the API Key of the job's project.
+    """
+    job = await db.get(IngestionJob, job_id)
+    if not job or job.project_id != project.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    chunks_per_second = None
+    if job.started_at:
+        elapsed = ((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds()
+        if elapsed > 0:
+            chunks_per_second = round((job.chunks_inserted or 0) / elapsed, 2)
+
+    return IngestJobStatus(
+        job_id=job.id,
+        project_id=job.project_id,
+        status=job.status,
+        kind=job.kind or "document",
+        mode=job.mode or "append",
+        source=job.source,
+        chunks_total=job.chunks_total or 0,
+        chunks_embedded=job.chunks_embedded or 0,
+        chunks_cached=job.chunks_cached or 0,
+        chunks_suppressed=job.chunks_suppressed or 0,
+        chunks_inserted=job.chunks_inserted or 0,
+        chunks_unchanged=job.chunks_unchanged or 0,
+        chunks_deleted=job.chunks_deleted or 0,
+        chunks_per_second=chunks_per_second,
+        error=job.error,
+        results=job.results,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
@@ -6,9 +6,13 @@ from uuid import uuid4
 import secrets
 
 from app.db.session import get_db
+from app.db.partitions import create_document_partition, drop_document_partition
 from app.models.all_models import Project
 from app.schemas.project import ProjectCreate, ProjectResponse, ProjectUpdate
 from app.api.deps import get_current_admin, get_write_admin
+from app.services.answer_cache import answer_cache
+from app.services.rag_service import validate_rag_config
+from app.services.vector_store import vector_store
 import sentry_sdk
 
 router = APIRouter()
@@ -45,6 +49,8 @@ async def create_project(
     )
     
     db.add(new_project)
+    await db.flush()
+    await create_document_partition(db, new_project.id)
     with sentry_sdk.start_span(op="db", description="create_project_commit"):
         await db.commit()
         await db.refresh(new_project)
@@ -89,14 +95,15 @@ async def delete_project(
         raise HTTPException(status_code=404, detail="Project not found")
 
     # Delete associated data explicitely to avoid FK violations if cascades aren't set up
-    from app.models.all_models import EmbedSettings, Document, ChatSession, ChatMessage
+    from app.models.all_models import EmbedSettings, ChatSession, ChatMessage, IngestionJob
     from sqlalchemy import delete
     
-    # 1. Delete EmbedSettings
+    # 1. Delete EmbedSettings and cached answers
     await db.execute(delete(EmbedSettings).where(EmbedSettings.project_id == project_id))
+    await answer_cache.invalidate(db, project.id)
     
-    # 2. Delete Documents
-    await db.execute(delete(Document).where(Document.project_id == project_id))
+    # 2. Delete job records
+    await db.execute(delete(IngestionJob).where(IngestionJob.project_id == project_id))
     
     # 3. Delete ChatMessages (via Sessions)
     # We need to find sessions first to delete messages, or use a subquery.
@@ -107,12 +114,18 @@ async def delete_project(
     
     # 4. Delete ChatSessions
     await db.execute(delete(ChatSession).where(ChatSession.project_id == project_id))
+    with sentry_sdk.start_span(op="db", description="delete_project_rows_commit"):
+        await db.commit()
 
-    # 5. Delete Project
+    # 5. Detach and drop the project's documents partition, without locking
+    # out other projects, then delete the project
+    with sentry_sdk.start_span(op="db", description="drop_document_partition"):
+        await drop_document_partition(project.id)
     await db.delete(project)
     
     with sentry_sdk.start_span(op="db", description="delete_project_commit"):
         await db.commit()
+    await vector_store.drop(project.id)
     
     return {"ok": True}
 
@@ -145,7 +158,15 @@ async def update_project(
     if project_in.welcome_message is not None:
         project.welcome_message = project_in.welcome_message
     if project_in.system_prompt is not None:
+        if project_in.system_prompt != project.system_prompt:
+            await answer_cache.invalidate(db, project.id)
         project.system_prompt = project_in.system_prompt
+    if project_in.rag_config is not None:
+        try:
+            validate_rag_config(project_in.rag_config)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        project.rag_config = project_in.rag_config
 
     with sentry_sdk.start_span(op="db", description="update_project_commit"):
         await db.commit()
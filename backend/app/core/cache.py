@@ -0,0 +1,75 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+class TTLLRUCache:
+    """
+    Bounded in-process LRU cache with a per-entry TTL and an approximate
+    memory budget. Not thread-safe: use it from the event loop only.
+    """
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl_seconds: float,
+        sizeof: Callable[[Any], int] = sys.getsizeof,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._sizeof = sizeof
+        # key -> (expires_at, size, value)
+        self._data: "OrderedDict[Hashable, tuple[float, int, Any]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _pop(self, key: Hashable) -> None:
+        _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] < time.monotonic():
+            self._pop(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def set(self, key: Hashable, value: Any, size: Optional[int] = None) -> None:
+        size = self._sizeof(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self._pop(key)
+        self._data[key] = (time.monotonic() + self.ttl_seconds, size, value)
+        self.bytes += size
+        while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._data.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
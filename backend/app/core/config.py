@@ -1,3 +1,4 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import List
 
@@ -22,6 +23,120 @@ class Settings(BaseSettings):
     GROQ_API_KEY: str = ""
 
     EMBEDDING_PROVIDER: str = "local"
+    EMBEDDING_MODEL_NAME: str = "all-MiniLM-L6-v2"
+    # Micro-batch concurrent embedding calls of the local model
+    EMBEDDING_BATCHING: bool = True
+    EMBEDDING_BATCH_MAX_SIZE: int = 64
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+    # EMBEDDING_PROVIDER=sidecar: workers call a shared embedding server
+    # (python -m app.services.embedding_sidecar) instead of loading the model
+    EMBEDDING_SIDECAR_URL: str = "unix:///tmp/converso-embeddings.sock"  # or tcp://host:port
+    EMBEDDING_SIDECAR_PROVIDER: str = "local"  # model the sidecar serves
+    EMBEDDING_SIDECAR_TIMEOUT_SECONDS: float = 30.0
+
+    # Query embedding cache used by RAGService (size 0 disables it)
+    QUERY_EMBEDDING_CACHE_SIZE: int = 10000
+    QUERY_EMBEDDING_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    QUERY_EMBEDDING_CACHE_TTL_SECONDS: int = 3600
+    # Share cached query vectors between workers through REDIS_URL
+    QUERY_EMBEDDING_CACHE_REDIS: bool = False
+
+    # Ingestion
+    INGEST_BATCH_SIZE: int = 256  # chunks embedded and written per batch
+    INGEST_EMBED_BATCH_SIZE: int = 64  # texts per embedding call within a batch
+    INGEST_EMBED_CONCURRENCY: int = 4  # embedding calls in flight per ingestion run
+    INGEST_EMBED_AHEAD: int = 1  # batches embedded ahead of the one being written
+    # Processes for splitting and MinHash per API worker process;
+    # -1 = one per core, 0 = threads only
+    INGEST_CPU_WORKERS: int = 2
+    INGEST_PDF_PAGES_PER_TASK: int = 8  # PDF pages extracted per CPU pool task
+    INGEST_COMMIT_ROWS: int = 5000  # commit after this many rows (sync ingestion commits once)
+    INGEST_BULK_MODE: str = "copy"  # copy (binary COPY) or insert (multi-row INSERT)
+    # Background ingestion jobs: payloads are spooled to disk and processed
+    # by INGEST_WORKERS asyncio tasks per API worker
+    INGEST_WORKERS: int = 2
+    # Running jobs refresh heartbeat_at this often; on startup, running jobs
+    # whose heartbeat is older than INGEST_JOB_STALE_SECONDS are requeued
+    INGEST_JOB_HEARTBEAT_SECONDS: int = 30
+    INGEST_JOB_STALE_SECONDS: int = 300
+    INGEST_SPOOL_DIR: str = "/tmp/converso-ingest"
+    # Reuse embeddings of chunks seen before (any project) from the embedding_cache table
+    INGEST_EMBEDDING_CACHE: bool = True
+    # Near-duplicate suppression: drop chunks whose estimated Jaccard similarity
+    # (MinHash over 3-word shingles) to a stored chunk is at least this value.
+    # 0 disables; projects can set rag_config["near_duplicate_threshold"].
+    INGEST_NEAR_DUP_THRESHOLD: float = 0.0
+    MINHASH_NUM_PERM: int = 128
+    MINHASH_BANDS: int = 16
+    # Files are streamed through ingestion, so this only bounds spool disk use
+    INGEST_MAX_FILE_BYTES: int = 1024 * 1024 * 1024  # 0 = unlimited
+    # Chat uploads are returned to the browser as text and stay small
+    CHAT_UPLOAD_MAX_BYTES: int = 5 * 1024 * 1024
+    # Run each turn's answer cache lookup and retrieval on a second pooled
+    # connection, concurrently with session and message bookkeeping
+    CHAT_CONCURRENT_RETRIEVAL: bool = True
+    # Write-behind persistence of chat sessions, messages and session metadata:
+    # queued rows are written in batches every CHAT_WRITE_FLUSH_MS, or once
+    # CHAT_WRITE_BATCH_ROWS are queued. Unflushed rows are lost on a crash;
+    # at CHAT_WRITE_MAX_PENDING queued rows new turns wait for a flush, for
+    # up to CHAT_WRITE_MAX_WAIT_SECONDS, before they take a connection.
+    CHAT_WRITE_BEHIND: bool = False
+    CHAT_WRITE_FLUSH_MS: int = 200
+    CHAT_WRITE_BATCH_ROWS: int = 500
+    CHAT_WRITE_MAX_PENDING: int = 10000
+    CHAT_WRITE_MAX_WAIT_SECONDS: float = 10.0
+
+    # Retrieval: candidates fetched per query, L2 distance cutoff (0 = none;
+    # embeddings are normalized, so 1.2 is ~0.28 cosine similarity) and the
+    # context size in estimated tokens. Overridable per project in rag_config
+    # as candidates / max_distance / context_token_budget.
+    RAG_CANDIDATES: int = 8
+    RAG_MAX_DISTANCE: float = 1.2
+    RAG_CONTEXT_TOKEN_BUDGET: int = 1500
+    # "vector" or "hybrid": vector and full-text (content_tsv) candidates fused
+    # with reciprocal rank fusion in one query
+    RAG_SEARCH_MODE: str = "vector"
+    RAG_HYBRID_CANDIDATES: int = 20  # per side
+    RAG_HYBRID_RRF_K: int = 60
+    # Best full-text matches kept in hybrid mode even beyond RAG_MAX_DISTANCE
+    RAG_HYBRID_KEEP_LEXICAL: int = 3
+    # "postgres" or "memory": exact search in the API process over memory-mapped
+    # copies of the project's vectors (rag_config "retrieval_backend"), for
+    # projects up to VECTOR_STORE_MAX_ROWS chunks
+    RAG_RETRIEVAL_BACKEND: str = "postgres"
+    VECTOR_STORE_DIR: str = "/tmp/converso-vectors"
+    VECTOR_STORE_MAX_ROWS: int = 200000
+    # Retrieval result cache, keyed on the project's corpus_version
+    RETRIEVAL_CACHE_SIZE: int = 5000  # entries; 0 disables
+    RETRIEVAL_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    RETRIEVAL_CACHE_TTL_SECONDS: int = 3600
+
+    # Semantic answer cache, opt-in per project with rag_config["semantic_cache"]
+    SEMANTIC_CACHE_MAX_DISTANCE: float = 0.08  # cosine distance between questions
+    SEMANTIC_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 5000  # per project, oldest pruned first
+
+    # Vector search (pgvector). The ANN index is built by migration using the
+    # build parameters below; search parameters are applied per query and can
+    # be overridden per project through Project.rag_config.
+    # Only hnsw: documents is partitioned per project, and an ivfflat index
+    # cascaded onto a new, empty partition would never be trained
+    VECTOR_INDEX_TYPE: str = "hnsw"
+    VECTOR_HNSW_M: int = 16
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 64
+    VECTOR_HNSW_EF_SEARCH: int = 40
+    VECTOR_IVFFLAT_LISTS: int = 1000  # pre-partitioning migrations only
+    # Projects with at most this many chunks use exact search instead of the index
+    VECTOR_EXACT_SEARCH_MAX_ROWS: int = 20000
+    VECTOR_ROW_COUNT_TTL_SECONDS: int = 300
+    # Index scan mode for metadata-filtered ANN searches: off, relaxed_order or
+    # strict_order (HNSW only). Requires pgvector >= 0.8.0, use "off" before.
+    VECTOR_ITERATIVE_SCAN: str = "relaxed_order"
+    # Compact first-pass search over HNSW expression indexes: "none", "halfvec"
+    # (half precision) or "binary" (sign bits, Hamming distance). Candidates are
+    # re-ranked by full-precision distance. Requires pgvector >= 0.7.0.
+    RAG_QUANTIZATION: str = "none"
+    RAG_RERANK_FACTOR: int = 4  # candidates fetched per requested result
     
     # JWT / Auth
     SECRET_KEY: str = "change-me-in-env"
@@ -42,4 +157,11 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
+    @field_validator("VECTOR_INDEX_TYPE")
+    @classmethod
+    def _hnsw_only(cls, value: str) -> str:
+        if value != "hnsw":
+            raise ValueError("only hnsw is supported for the per-project partitions of documents")
+        return value
+
 settings = Settings()
@@ -0,0 +1,98 @@
+"""
+Bulk writes through PostgreSQL binary COPY (asyncpg copy_to_table).
+
+Rows are encoded straight to the binary COPY wire format, so vectors go over
+the wire as packed float32 instead of 384-float text literals and no ORM
+objects are created.
+"""
+import json
+import struct
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterable, List, Sequence
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_TRAILER = struct.pack("!h", -1)
+_NULL = struct.pack("!i", -1)
+_PG_EPOCH = datetime(2000, 1, 1)
+# Rows per chunk handed to asyncpg while streaming
+_ROWS_PER_CHUNK = 500
+
+def encode_uuid(value: uuid.UUID) -> bytes:
+    return value.bytes
+
+def encode_text(value: str) -> bytes:
+    return value.encode("utf-8")
+
+def encode_jsonb(value) -> bytes:
+    # jsonb binary format: version byte followed by the JSON text
+    return b"\x01" + json.dumps(value).encode("utf-8")
+
+def encode_vector(value) -> bytes:
+    # pgvector binary format: int16 dim, int16 unused, big-endian float32 values
+    values = np.asarray(value, dtype=">f4")
+    return struct.pack("!hh", values.size, 0) + values.tobytes()
+
+def encode_bytea(value: bytes) -> bytes:
+    return bytes(value)
+
+def encode_bigint_array(value: Sequence[int]) -> bytes:
+    # array binary format: ndim, has-null flag, element oid (int8 = 20),
+    # then length and lower bound per dimension, then length-prefixed elements
+    header = struct.pack("!iiiii", 1, 0, 20, len(value), 1)
+    return header + b"".join(struct.pack("!iq", 8, item) for item in value)
+
+def encode_timestamp(value: datetime) -> bytes:
+    # timestamp without time zone: int64 microseconds since 2000-01-01
+    delta = value - _PG_EPOCH
+    return struct.pack("!q", (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds)
+
+def encode_rows(rows: Iterable[Sequence], encoders: Sequence[Callable]) -> bytes:
+    field_count = struct.pack("!h", len(encoders))
+    parts: List[bytes] = []
+    for row in rows:
+        parts.append(field_count)
+        for value, encode in zip(row, encoders):
+            if value is None:
+                parts.append(_NULL)
+            else:
+                data = encode(value)
+                parts.append(struct.pack("!i", len(data)))
+                parts.append(data)
+    return b"".join(parts)
+
+async def _stream(rows: Sequence[Sequence], encoders: Sequence[Callable]) -> AsyncIterator[bytes]:
+    yield _HEADER
+    for start in range(0, len(rows), _ROWS_PER_CHUNK):
+        yield encode_rows(rows[start:start + _ROWS_PER_CHUNK], encoders)
+    yield _TRAILER
+
+async def copy_rows(
+    db: AsyncSession,
+    table: str,
+    columns: Sequence[str],
+    encoders: Sequence[Callable],
+    rows: Sequence[Sequence],
+) -> int:
+    """
+    COPY rows into table on the session's connection, inside its transaction.
+    """
+    if not rows:
+        return 0
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    driver = raw.driver_connection
+    if not driver.is_in_transaction():
+        # The asyncpg adapter opens its transaction on the first statement;
+        # make sure COPY is part of it instead of autocommitting.
+        await db.execute(select(1))
+    await driver.copy_to_table(
+        table,
+        source=_stream(rows, encoders),
+        columns=list(columns),
+        format="binary",
+    )
+    return len(rows)
@@ -0,0 +1,61 @@
+"""
+Per-project partitions of the documents table.
+
+documents is LIST-partitioned by project_id with one partition per project,
+so each tenant has its own heap and its own copy of every index (vector
+indexes included), and queries filtered by project_id only touch that
+partition. Every project needs a partition before it can have documents;
+there is no default partition, which would make attaching scan it and rule
+out detaching concurrently.
+
+Neither helper takes a lock on documents that blocks other tenants' reads
+or writes: partitions are built standalone and attached (SHARE UPDATE
+EXCLUSIVE), and detached concurrently before they are dropped.
+"""
+import uuid
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import engine
+
+def document_partition(project_id: uuid.UUID) -> str:
+    return f"documents_p_{uuid.UUID(str(project_id)).hex}"
+
+async def create_document_partition(db: AsyncSession, project_id: uuid.UUID) -> None:
+    """
+    Create and attach the project's partition in the caller's transaction;
+    commit soon after, the attach locks are held until then. The indexes of
+    documents are built on the (empty) table when it is attached.
+    """
+    project_id = uuid.UUID(str(project_id))
+    name = document_partition(project_id)
+    exists = (await db.execute(text("SELECT to_regclass(:name)"), {"name": name})).scalar()
+    if exists is not None:
+        return
+    await db.execute(text(f"CREATE TABLE {name} (LIKE documents INCLUDING DEFAULTS INCLUDING GENERATED)"))
+    await db.execute(text(f"ALTER TABLE documents ATTACH PARTITION {name} FOR VALUES IN ('{project_id}')"))
+
+async def drop_document_partition(project_id: uuid.UUID) -> None:
+    """
+    Detach the project's partition concurrently, then drop it with all its
+    documents. Runs on its own autocommit connection (DETACH ... CONCURRENTLY
+    cannot run in a transaction block); commit the deletes of rows that
+    depend on the project first. A detach interrupted earlier is finalized.
+    """
+    name = document_partition(project_id)
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        state = (await conn.execute(
+            text(
+                "SELECT c.relispartition, i.inhdetachpending FROM pg_class c "
+                "LEFT JOIN pg_inherits i ON i.inhrelid = c.oid WHERE c.oid = to_regclass(:name)"
+            ),
+            {"name": name},
+        )).first()
+        if state is None:
+            return
+        is_partition, detach_pending = state
+        if detach_pending:
+            await conn.execute(text(f"ALTER TABLE documents DETACH PARTITION {name} FINALIZE"))
+        elif is_partition:
+            await conn.execute(text(f"ALTER TABLE documents DETACH PARTITION {name} CONCURRENTLY"))
+        await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
@@ -13,6 +13,9 @@ from app.api.v1.endpoints import chat, projects, ingestion, analytics, embed, au
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from app.core.limiter import limiter
+from app.services.ingestion_jobs import ingestion_jobs
+from app.services.chat_writer import chat_writer
+from app.services import cpu_pool
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -62,6 +65,17 @@ app.include_router(auth.router, prefix=settings.API_V1_STR + "/auth", tags=["aut
 app.include_router(conversations.router, prefix=settings.API_V1_STR + "/conversations", tags=["conversations"])
 app.include_router(admins.router, prefix=settings.API_V1_STR + "/admins", tags=["admins"])
 
+@app.on_event("startup")
+async def start_background_workers():
+    await ingestion_jobs.start()
+    await chat_writer.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await ingestion_jobs.stop()
+    await chat_writer.stop()
+    cpu_pool.shutdown()
+
 @app.get("/")
 def root():
     return {"message": "Converso Chatbot API is running"}
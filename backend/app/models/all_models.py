@@ -1,6 +1,6 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Boolean, Integer
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Boolean, Integer, LargeBinary, BigInteger, Computed
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY, TSVECTOR
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from pgvector.sqlalchemy import Vector
@@ -18,6 +18,10 @@ class Project(Base):
     vector_namespace = Column(String, unique=True, nullable=False)
     system_prompt = Column(Text, nullable=True)
     welcome_message = Column(Text, nullable=True)
+    # Per-project retrieval tuning, e.g. {"ef_search": 80, "exact_search_max_rows": 5000}
+    rag_config = Column(JSONB, default={})
+    # Bumped whenever the project's documents change; keys retrieval caches
+    corpus_version = Column(Integer, nullable=False, default=0)
     
     sessions = relationship("ChatSession", back_populates="project")
     documents = relationship("Document", back_populates="project")
@@ -57,16 +61,83 @@ class ChatMessage(Base):
 
 class Document(Base):
     __tablename__ = "documents"
+    # LIST-partitioned by project_id, one partition per project (app/db/partitions.py)
+    __table_args__ = {"postgresql_partition_by": "LIST (project_id)"}
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
+    # Part of the primary key, as required for the partition key
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), primary_key=True, index=True)
     content = Column(Text, nullable=False)
+    # Generated full-text vector for hybrid search, GIN-indexed (ix_documents_content_tsv)
+    content_tsv = Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True))
+    # GIN-indexed (ix_documents_metadata, jsonb_path_ops) for retrieval filters
     metadata_ = Column("metadata", JSONB, default={})
-    embedding = Column(Vector(384)) # all-MiniLM-L6-v2 dimension
+    # all-MiniLM-L6-v2 dimension. The ANN index (ix_documents_embedding_ann) is managed by migration.
+    embedding = Column(Vector(384))
+    # sha256 of the whitespace-normalized content, see chunking.content_hash
+    content_hash = Column(String(64), nullable=True)
+    # MinHash signature and LSH band keys (GIN-indexed), set when near-duplicate
+    # suppression is enabled for the project, see services/minhash.py
+    minhash = Column(LargeBinary, nullable=True)
+    lsh_bands = Column(ARRAY(BigInteger), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     project = relationship("Project", back_populates="documents")
 
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued") # queued, running, completed, failed
+    kind = Column(String, nullable=False, default="document") # document (text), pdf, or bulk: jsonl, zip
+    mode = Column(String, nullable=False, default="append") # append, sync
+    source = Column(String, nullable=True)
+    metadata_ = Column("metadata", JSONB, default={})
+    # Spooled payload on the local disk of the worker that accepted the job
+    payload_path = Column(String, nullable=True)
+    chunks_total = Column(Integer, default=0)
+    chunks_embedded = Column(Integer, default=0)
+    chunks_inserted = Column(Integer, default=0)
+    # sync mode: chunks already stored for the source, and stale chunks removed
+    chunks_unchanged = Column(Integer, default=0)
+    chunks_deleted = Column(Integer, default=0)
+    # Chunks whose embedding came from the embedding cache instead of the model
+    chunks_cached = Column(Integer, default=0)
+    # Near-duplicate chunks dropped before embedding
+    chunks_suppressed = Column(Integer, default=0)
+    # Bulk jobs: one {"item", "source", "status", "chunks", "error"} per document
+    results = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    # Refreshed by the worker running the job; running jobs whose heartbeat
+    # stopped (crash, redeploy) are requeued on startup
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class ChunkEmbedding(Base):
+    # Embeddings of previously ingested chunks, shared across projects
+    __tablename__ = "embedding_cache"
+
+    model_id = Column(String, primary_key=True)
+    content_hash = Column(String(64), primary_key=True)
+    embedding = Column(Vector(384), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class AnswerCacheEntry(Base):
+    __tablename__ = "answer_cache_entries"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False, index=True)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    embedding = Column(Vector(384))
+    # Hash of the system prompt the answer was generated with
+    prompt_hash = Column(String, nullable=False)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class AdminUser(Base):
     __tablename__ = "admin_users"
 
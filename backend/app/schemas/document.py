@@ -1,10 +1,41 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Literal
+from uuid import UUID
+from datetime import datetime
 
 class IngestTextRequest(BaseModel):
     text: str
     metadata: Optional[Dict[str, Any]] = None
+    # sync replaces the stored chunks of metadata["source"], re-embedding only new ones
+    mode: Literal["append", "sync"] = "append"
 
 class IngestResponse(BaseModel):
     documents_processed: int
     message: str
+
+class IngestJobResponse(BaseModel):
+    job_id: UUID
+    status: str
+    message: str
+
+class IngestJobStatus(BaseModel):
+    job_id: UUID
+    project_id: UUID
+    status: str
+    kind: str = "document"
+    mode: str = "append"
+    source: Optional[str] = None
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_cached: int = 0
+    chunks_suppressed: int = 0
+    chunks_inserted: int = 0
+    chunks_unchanged: int = 0
+    chunks_deleted: int = 0
+    chunks_per_second: Optional[float] = None
+    error: Optional[str] = None
+    # Bulk jobs: per-item outcome, filled in when the job ends
+    results: Optional[List[Dict[str, Any]]] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -1,7 +1,7 @@
 from pydantic import BaseModel
 from uuid import UUID
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict, Any
 
 class ProjectBase(BaseModel):
     name: str
@@ -17,10 +17,13 @@ class ProjectUpdate(BaseModel):
     description: Optional[str] = None
     welcome_message: Optional[str] = None
     system_prompt: Optional[str] = None
+    rag_config: Optional[Dict[str, Any]] = None
 
 class ProjectResponse(ProjectBase):
     id: UUID
     api_key: str
+    rag_config: Optional[Dict[str, Any]] = None
+    corpus_version: int = 0
     created_at: datetime
     updated_at: Optional[datetime] = None
 
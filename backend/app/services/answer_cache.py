@@ -0,0 +1,105 @@
+import hashlib
+import re
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncGenerator, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete
+from app.models.all_models import AnswerCacheEntry, Project
+from app.core.config import settings
+
+class AnswerCache:
+    """
+    Per-project semantic cache of previous (question embedding, answer) pairs.
+    Opt-in through Project.rag_config["semantic_cache"]. Entries are scoped to
+    the system prompt they were generated with and are purged when the
+    project's documents change.
+    """
+    def is_enabled(self, project: Project) -> bool:
+        return bool((project.rag_config or {}).get("semantic_cache", False))
+
+    @staticmethod
+    def prompt_hash(project: Project) -> str:
+        return hashlib.sha256((project.system_prompt or "").encode("utf-8")).hexdigest()
+
+    def _max_distance(self, project: Project) -> float:
+        return float(
+            (project.rag_config or {}).get("semantic_cache_max_distance", settings.SEMANTIC_CACHE_MAX_DISTANCE)
+        )
+
+    async def _closest(self, db: AsyncSession, project: Project, query_vector: List[float]):
+        """
+        The live entry closest to query_vector if it is within the project's
+        similarity threshold, as an (id, answer, distance) row.
+        """
+        distance = AnswerCacheEntry.embedding.cosine_distance(query_vector)
+        oldest = datetime.utcnow() - timedelta(seconds=settings.SEMANTIC_CACHE_TTL_SECONDS)
+        stmt = select(AnswerCacheEntry.id, AnswerCacheEntry.answer, distance.label("distance")).where(
+            AnswerCacheEntry.project_id == project.id,
+            AnswerCacheEntry.prompt_hash == self.prompt_hash(project),
+            AnswerCacheEntry.created_at >= oldest,
+        ).order_by(distance).limit(1)
+        row = (await db.execute(stmt)).first()
+        if row is None or row.distance > self._max_distance(project):
+            return None
+        return row
+
+    async def lookup(self, db: AsyncSession, project: Project, query_vector: List[float]) -> Optional[str]:
+        """
+        Return the cached answer of the closest previous question, if it is
+        within the project's similarity threshold. Runs in a savepoint, so a
+        failure leaves the caller's transaction usable; the caller commits
+        the hit count.
+        """
+        async with db.begin_nested():
+            row = await self._closest(db, project, query_vector)
+            if row is None:
+                return None
+            await db.execute(
+                update(AnswerCacheEntry).where(AnswerCacheEntry.id == row.id).values(hits=AnswerCacheEntry.hits + 1)
+            )
+        return row.answer
+
+    async def store(self, db: AsyncSession, project: Project, question: str, query_vector: List[float], answer: str) -> None:
+        """
+        Cache an answer unless a near-identical question is cached already
+        (e.g. asked concurrently), then prune the project's expired entries
+        and its oldest ones beyond SEMANTIC_CACHE_MAX_ENTRIES. Runs in a
+        savepoint of the caller's transaction.
+        """
+        async with db.begin_nested():
+            if await self._closest(db, project, query_vector) is not None:
+                return
+            db.add(AnswerCacheEntry(
+                project_id=project.id,
+                question=question,
+                answer=answer,
+                embedding=query_vector,
+                prompt_hash=self.prompt_hash(project),
+            ))
+            oldest = datetime.utcnow() - timedelta(seconds=settings.SEMANTIC_CACHE_TTL_SECONDS)
+            await db.execute(delete(AnswerCacheEntry).where(
+                AnswerCacheEntry.project_id == project.id,
+                AnswerCacheEntry.created_at < oldest,
+            ))
+            overflow = select(AnswerCacheEntry.id).where(
+                AnswerCacheEntry.project_id == project.id
+            ).order_by(
+                AnswerCacheEntry.created_at.desc()
+            ).offset(settings.SEMANTIC_CACHE_MAX_ENTRIES)
+            await db.execute(delete(AnswerCacheEntry).where(AnswerCacheEntry.id.in_(overflow)))
+
+    async def invalidate(self, db: AsyncSession, project_id: uuid.UUID) -> None:
+        """
+        Drop all cached answers of a project. Runs in the caller's transaction.
+        """
+        await db.execute(delete(AnswerCacheEntry).where(AnswerCacheEntry.project_id == project_id))
+
+    async def replay(self, answer: str) -> AsyncGenerator[str, None]:
+        """
+        Stream a cached answer word by word, like the LLM stream.
+        """
+        for token in re.findall(r"\S+\s*", answer):
+            yield token
+
+answer_cache = AnswerCache()
@@ -0,0 +1,80 @@
+"""
+Readers for bulk ingestion payloads.
+
+JSONL: one document per line, {"text": "...", "metadata": {"source": "...", ...}}.
+Zip: every .txt/.md entry is a document whose source is the entry path.
+"""
+import asyncio
+import json
+import zipfile
+from typing import AsyncIterator, List, Optional, Tuple
+from langchain_core.documents import Document as TextChunk
+from app.core.config import settings
+from app.services.chunking import StreamingTextSplitter, iterate_text, read_text_blocks
+
+BULK_FORMATS = ("jsonl", "zip")
+_TEXT_EXTENSIONS = (".txt", ".md")
+
+def bulk_format(filename: str) -> Optional[str]:
+    name = filename.lower()
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if name.endswith(".zip"):
+        return "zip"
+    return None
+
+async def _jsonl_items(path: str, results: List[dict]) -> AsyncIterator[Tuple[dict, dict, AsyncIterator[str]]]:
+    with open(path, "rb") as f:
+        index = 0
+        while True:
+            line = await asyncio.to_thread(f.readline)
+            if not line:
+                break
+            if not line.strip():
+                continue
+            result = {"item": index, "source": None, "status": "ingested", "chunks": 0}
+            results.append(result)
+            index += 1
+            try:
+                entry = json.loads(line)
+                text = entry["text"]
+                metadata = entry.get("metadata") or {}
+                if not isinstance(text, str) or not isinstance(metadata, dict):
+                    raise ValueError("text must be a string and metadata an object")
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                result.update(status="failed", error=f"Invalid entry: {e}")
+                continue
+            result["source"] = metadata.get("source")
+            yield result, metadata, iterate_text(text)
+
+async def _zip_items(path: str, results: List[dict]) -> AsyncIterator[Tuple[dict, dict, AsyncIterator[str]]]:
+    with zipfile.ZipFile(path) as archive:
+        for index, info in enumerate(i for i in archive.infolist() if not i.is_dir()):
+            result = {"item": index, "source": info.filename, "status": "ingested", "chunks": 0}
+            results.append(result)
+            if not info.filename.lower().endswith(_TEXT_EXTENSIONS):
+                result.update(status="skipped", error="Only .txt and .md entries are ingested")
+                continue
+            if settings.INGEST_MAX_FILE_BYTES and info.file_size > settings.INGEST_MAX_FILE_BYTES:
+                result.update(status="skipped", error="Entry too large")
+                continue
+            with archive.open(info) as entry:
+                yield result, {"source": info.filename}, read_text_blocks(entry)
+
+async def bulk_chunks(
+    path: str, fmt: str, splitter: StreamingTextSplitter, results: List[dict]
+) -> AsyncIterator[TextChunk]:
+    """
+    Chunks of every document in a bulk payload, in order. Appends one result
+    per item to `results` and counts its chunks; items that cannot be read
+    are marked failed or skipped without stopping the others.
+    """
+    items = _jsonl_items(path, results) if fmt == "jsonl" else _zip_items(path, results)
+    async for result, metadata, blocks in items:
+        try:
+            async for chunk in splitter.split(blocks, metadata=metadata):
+                result["chunks"] += 1
+                yield chunk
+        except UnicodeDecodeError:
+            # Chunks already yielded for the entry are kept
+            result.update(status="failed", error="Only UTF-8 text is supported")
@@ -1,19 +1,26 @@
 import asyncio
+import time
+from contextlib import nullcontext
 from uuid import UUID, uuid4
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from langchain_core.messages import HumanMessage, SystemMessage
 from app.services.rag_service import rag_service
+from app.services.answer_cache import answer_cache
+from app.services.chat_writer import chat_writer
 from app.core.config import settings
-from app.models.all_models import Project, ChatSession, ChatMessage
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import Project, ChatSession
 from app.services.llm_factory import get_llm
-from datetime import datetime
 import logging
 
 from app.services.email import send_email
 
 logger = logging.getLogger(__name__)
 
+def _elapsed_ms(start: float) -> int:
+    return int((time.perf_counter() - start) * 1000)
+
 class ChatService:
     def __init__(self):
         # Use factory to get configured LLM
@@ -21,98 +28,241 @@ class ChatService:
 
     async def process_message(
         self, 
-        db: AsyncSession,
         project_id: UUID, 
         message: str, 
-        session_id: Optional[str]
+        session_id: Optional[str],
+        filters: Optional[dict] = None,
     ) -> AsyncGenerator[str, None]:
         """
         Process a user message with RAG and stream back the response.
+        `filters` restricts retrieval by document metadata.
+
+        The turn opens its own sessions: one for the reads and writes before
+        generation, one to persist the answer after it. No database
+        connection is held while tokens stream. Chat rows go through
+        chat_writer, which may queue them for batched writing.
         """
-        # 1. Get Project Settings (System Prompt)
-        project = await db.get(Project, project_id)
-        if not project:
-            yield "Error: Project not found."
+        # The query embedding depends on no DB state, start it right away
+        turn_start = time.perf_counter()
+        timings: Dict[str, int] = {}
+        embedding = asyncio.create_task(self._embed(message, timings))
+
+        # Backpressure of the chat write buffer, before taking a connection
+        if not await chat_writer.wait_for_room():
+            embedding.cancel()
+            logger.error(f"Chat write buffer full, refusing a turn for project {project_id}")
+            yield "Error: Chat storage is unavailable, please try again shortly."
             return
 
-        # 1.1 Ensure ChatSession exists
-        session = None
-        if session_id:
-            session = await db.get(ChatSession, UUID(session_id))
-        if not session:
-            session = ChatSession(project_id=project_id)
-            db.add(session)
-            await db.flush()
-            session_id = str(session.id)
-
-        # 1.2 Persist user message
-        user_msg = ChatMessage(session_id=session.id, role="user", content=message)
-        db.add(user_msg)
-        
-        # Check for human handoff
-        handoff_keywords = ["human", "support", "agent", "person"]
-        if any(k in message.lower() for k in handoff_keywords):
-             logger.warning(f"Human handoff triggered for session {session_id}")
-             meta = session.metadata_ or {}
-             meta["needs_human"] = True
-             session.metadata_ = meta
-             db.add(session)
-             
-             if settings.ADMIN_EMAIL:
-                 # Run in thread to avoid blocking async loop
-                 asyncio.create_task(
-                     asyncio.to_thread(
-                         send_email,
-                         settings.ADMIN_EMAIL,
-                         f"Human Handoff Request: Project {project.name}",
-                         f"User in session {session_id} requested human support.\nMessage: {message}"
-                     )
-                 )
-        
-        await db.flush()
-        user_time = datetime.utcnow()
-
-        # 2. Retrieve Context (robust)
+        retrieval = None
         try:
-            context = await rag_service.retrieve_context(db, project_id, message)
-        except Exception as e:
-            logger.warning(f"RAG context retrieval failed for project {project_id}: {e}")
-            context = ""
-        
-        # 3. Construct Prompt
-        system_prompt = project.system_prompt or "You are a helpful AI assistant."
-        if context:
-            system_prompt += f"\n\nRelevant Context:\n{context}\n\nAnswer based on the context above."
-            
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=message)
-        ]
-
-        # 4. Stream Response from LLM, track response time, and persist assistant message
+            async with AsyncSessionLocal() as db:
+                # 1. Get Project Settings (System Prompt)
+                stage_start = time.perf_counter()
+                project = await db.get(Project, project_id)
+                timings["project_ms"] = _elapsed_ms(stage_start)
+                if not project:
+                    embedding.cancel()
+                    yield "Error: Project not found."
+                    return
+
+                # 2. Answer cache lookup and retrieval, on their own session so
+                # they overlap with the bookkeeping below
+                if settings.CHAT_CONCURRENT_RETRIEVAL:
+                    retrieval = asyncio.create_task(
+                        self._retrieve_in_session(project, message, filters, embedding, timings)
+                    )
+
+                # 2.1 Ensure ChatSession exists (possibly still queued for writing)
+                stage_start = time.perf_counter()
+                session_uuid = UUID(session_id) if session_id else None
+                if session_uuid is not None and not chat_writer.has_unflushed_session(session_uuid):
+                    if await db.get(ChatSession, session_uuid) is None:
+                        session_uuid = None
+                if session_uuid is None:
+                    session_uuid = await chat_writer.add_session(db, project_id)
+                    session_id = str(session_uuid)
+
+                # 2.2 Persist user message
+                await chat_writer.add_message(db, session_uuid, "user", message)
+                
+                # Check for human handoff
+                handoff_keywords = ["human", "support", "agent", "person"]
+                if any(k in message.lower() for k in handoff_keywords):
+                     logger.warning(f"Human handoff triggered for session {session_id}")
+                     await chat_writer.patch_session(db, session_uuid, {"needs_human": True})
+                     
+                     if settings.ADMIN_EMAIL:
+                         # Run in thread to avoid blocking async loop
+                         asyncio.create_task(
+                             asyncio.to_thread(
+                                 send_email,
+                                 settings.ADMIN_EMAIL,
+                                 f"Human Handoff Request: Project {project.name}",
+                                 f"User in session {session_id} requested human support.\nMessage: {message}"
+                             )
+                         )
+                
+                # Commit the bookkeeping and release the connection, so a turn
+                # never holds one while waiting for the retrieval session's
+                await db.commit()
+                timings["session_ms"] = _elapsed_ms(stage_start)
+
+                if retrieval is None:
+                    stage_start = time.perf_counter()
+                    cached_answer, context, query_vector = await self._retrieve(
+                        db, project, message, filters, embedding, timings
+                    )
+                    timings["retrieval_wait_ms"] = _elapsed_ms(stage_start)
+                    # Release the connection before generation
+                    await db.commit()
+
+            # 3. Wait for cache lookup and retrieval
+            if retrieval is not None:
+                stage_start = time.perf_counter()
+                cached_answer, context, query_vector = await retrieval
+                timings["retrieval_wait_ms"] = _elapsed_ms(stage_start)
+        except BaseException:
+            embedding.cancel()
+            if retrieval is not None:
+                retrieval.cancel()
+            raise
+
+        use_answer_cache = answer_cache.is_enabled(project) and query_vector is not None
+        if cached_answer is not None:
+            logger.info(f"Answer cache hit for project {project_id} session {session_id}")
+            token_stream = answer_cache.replay(cached_answer)
+        else:
+            # 4. Construct Prompt
+            system_prompt = project.system_prompt or "You are a helpful AI assistant."
+            if context:
+                system_prompt += f"\n\nRelevant Context:\n{context}\n\nAnswer based on the context above."
+
+            messages = [
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=message)
+            ]
+            logger.info(f"Starting LLM stream for project {project_id} session {session_id}")
+            token_stream = self._stream_llm(messages)
+
+        # 5. Stream Response, track response time, and persist assistant message
         first_token_time_ms: Optional[float] = None
         full_response_parts: list[str] = []
+        completed = False
         try:
-            logger.info(f"Starting LLM stream for project {project_id} session {session_id}")
-            async for chunk in self.llm.astream(messages):
-                if chunk.content:
-                    if first_token_time_ms is None:
-                        first_token_time_ms = (datetime.utcnow() - user_time).total_seconds() * 1000.0
-                    yield chunk.content
-                    full_response_parts.append(chunk.content)
+            async for token in token_stream:
+                if first_token_time_ms is None:
+                    # From the message's arrival, so the overlapped stages count
+                    first_token_time_ms = (time.perf_counter() - turn_start) * 1000.0
+                    timings["first_token_ms"] = int(first_token_time_ms)
+                yield token
+                full_response_parts.append(token)
+            completed = True
         except Exception as e:
             logger.error(f"LLM streaming error for project {project_id} session {session_id}: {e}")
             yield f"Error generating response: {str(e)}"
             full_response_parts.append(f"Error generating response: {str(e)}")
         finally:
             assistant_content = "".join(full_response_parts).strip()
-            assistant_msg = ChatMessage(session_id=session.id, role="assistant", content=assistant_content or "")
-            db.add(assistant_msg)
-            # Update session metadata with last_response_ms
-            meta = session.metadata_ or {}
+            logger.info(f"Turn timings for project {project_id} session {session_id}: {timings}")
+            # last_response_ms and the turn's stage timings
+            patch = {"last_timings_ms": timings}
             if first_token_time_ms is not None:
-                meta["last_response_ms"] = int(first_token_time_ms)
-            session.metadata_ = meta
-            await db.commit()
+                patch["last_response_ms"] = int(first_token_time_ms)
+            # Only cache answers that streamed to the end without errors
+            store_answer = bool(use_answer_cache and cached_answer is None and completed and assistant_content)
+            # Queued writes need no connection
+            needs_db = store_answer or not chat_writer.enabled
+            async with (AsyncSessionLocal() if needs_db else nullcontext()) as db:
+                await chat_writer.add_message(db, session_uuid, "assistant", assistant_content or "")
+                await chat_writer.patch_session(db, session_uuid, patch)
+                if store_answer:
+                    try:
+                        await answer_cache.store(db, project, message, query_vector, assistant_content)
+                    except Exception as e:
+                        logger.warning(f"Answer cache store failed for project {project_id}: {e}")
+                if db is not None:
+                    await db.commit()
+
+    async def _embed(self, message: str, timings: Dict[str, int]) -> List[float]:
+        stage_start = time.perf_counter()
+        try:
+            return await rag_service.embed_query(message)
+        finally:
+            timings["embed_ms"] = _elapsed_ms(stage_start)
+
+    async def _retrieve(
+        self,
+        db: AsyncSession,
+        project: Project,
+        message: str,
+        filters: Optional[dict],
+        embedding: "asyncio.Task[List[float]]",
+        timings: Dict[str, int],
+    ) -> Tuple[Optional[str], str, Optional[List[float]]]:
+        """
+        Semantic answer cache lookup (opt-in per project), then context
+        retrieval, once the query embedding is ready. Returns (cached answer,
+        context, query vector); failures degrade to no cache hit or no context.
+        """
+        try:
+            query_vector = await embedding
+        except Exception as e:
+            # retrieve_context embeds the query itself
+            logger.warning(f"Query embedding failed for project {project.id}: {e}")
+            query_vector = None
+
+        stage_start = time.perf_counter()
+        if answer_cache.is_enabled(project) and query_vector is not None:
+            try:
+                cached_answer = await answer_cache.lookup(db, project, query_vector)
+            except Exception as e:
+                logger.warning(f"Answer cache lookup failed for project {project.id}: {e}")
+                cached_answer = None
+            if cached_answer is not None:
+                timings["retrieval_ms"] = _elapsed_ms(stage_start)
+                return cached_answer, "", query_vector
+
+        try:
+            context = await rag_service.retrieve_context(
+                db, project.id, message, config=project.rag_config, query_vector=query_vector,
+                corpus_version=project.corpus_version, filters=filters,
+            )
+        except Exception as e:
+            logger.warning(f"RAG context retrieval failed for project {project.id}: {e}")
+            context = ""
+        timings["retrieval_ms"] = _elapsed_ms(stage_start)
+        return None, context, query_vector
+
+    async def _retrieve_in_session(
+        self,
+        project: Project,
+        message: str,
+        filters: Optional[dict],
+        embedding: "asyncio.Task[List[float]]",
+        timings: Dict[str, int],
+    ) -> Tuple[Optional[str], str, Optional[List[float]]]:
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await self._retrieve(db, project, message, filters, embedding, timings)
+                try:
+                    # Answer cache hit counts
+                    await db.commit()
+                except Exception as e:
+                    logger.warning(f"Retrieval session commit failed for project {project.id}: {e}")
+                return result
+        except Exception as e:
+            # E.g. no pooled connection within the pool timeout: answer without context
+            logger.warning(f"Retrieval session failed for project {project.id}: {e}")
+            try:
+                query_vector = await embedding
+            except Exception:
+                query_vector = None
+            return None, "", query_vector
+
+    async def _stream_llm(self, messages: list) -> AsyncGenerator[str, None]:
+        async for chunk in self.llm.astream(messages):
+            if chunk.content:
+                yield chunk.content
 
 chat_service = ChatService()
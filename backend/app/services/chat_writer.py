@@ -0,0 +1,283 @@
+"""
+Persistence of chat sessions, messages and session metadata.
+
+By default rows are written in the caller's session. With CHAT_WRITE_BEHIND
+they are queued in memory instead, and a background task writes everything
+queued every CHAT_WRITE_FLUSH_MS (sooner once CHAT_WRITE_BATCH_ROWS rows are
+waiting) in one transaction: multi-row inserts for sessions and messages and
+one jsonb `||` patch per session for metadata.
+
+Durability: rows not flushed yet are lost if the process dies; they are at
+most CHAT_WRITE_FLUSH_MS old, plus however long the database has been
+failing: failed flushes are retried. At CHAT_WRITE_MAX_PENDING queued rows,
+new turns wait for a flush in wait_for_room (before taking a connection, so
+waiting turns never hold the connections the flush needs) and are refused
+after CHAT_WRITE_MAX_WAIT_SECONDS, so an outage stalls chats instead of
+growing memory. Queueing itself never blocks. A batch the database rejects is written session by session and only
+the failing sessions' rows are dropped (and logged). The queue is flushed on
+shutdown.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from sqlalchemy import bindparam, cast, func, insert, literal, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import ChatMessage, ChatSession
+
+logger = logging.getLogger(__name__)
+
+_sessions_table = ChatSession.__table__
+
+def _patch_statement():
+    """
+    UPDATE merging a patch into a session's metadata; executemany-able.
+    """
+    return update(_sessions_table).where(
+        _sessions_table.c.id == bindparam("session_id")
+    ).values(
+        metadata=func.coalesce(_sessions_table.c.metadata, cast(literal("{}"), JSONB)).op("||")(
+            bindparam("patch", type_=JSONB)
+        )
+    )
+
+class ChatWriter:
+    def __init__(self):
+        self._sessions: List[dict] = []
+        self._messages: List[dict] = []
+        # session id -> merged metadata patch
+        self._patches: Dict[uuid.UUID, dict] = {}
+        # Sessions queued or being flushed, so later turns find them
+        self._unflushed_sessions: Set[uuid.UUID] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.rows_dropped = 0
+        self.failures = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.CHAT_WRITE_BEHIND
+
+    def pending(self) -> int:
+        return len(self._sessions) + len(self._messages) + len(self._patches)
+
+    def has_unflushed_session(self, session_id: uuid.UUID) -> bool:
+        return session_id in self._unflushed_sessions
+
+    async def start(self) -> None:
+        if not self.enabled or self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the flush task and write everything still queued.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        for _ in range(3):
+            if not self.pending():
+                break
+            await self.flush()
+        if self.pending():
+            logger.error(f"Chat write buffer stopped with {self.pending()} unwritten rows")
+
+    async def add_session(self, db: Optional[AsyncSession], project_id: uuid.UUID) -> uuid.UUID:
+        """
+        Create a chat session and return its id.
+        """
+        if not self.enabled:
+            session = ChatSession(project_id=project_id)
+            db.add(session)
+            await db.flush()
+            return session.id
+        session_id = uuid.uuid4()
+        self._sessions.append({
+            "id": session_id,
+            "project_id": project_id,
+            "created_at": datetime.utcnow(),
+            "metadata_": {},
+        })
+        self._unflushed_sessions.add(session_id)
+        await self._queued()
+        return session_id
+
+    async def add_message(self, db: Optional[AsyncSession], session_id: uuid.UUID, role: str, content: str) -> None:
+        if not self.enabled:
+            db.add(ChatMessage(session_id=session_id, role=role, content=content))
+            return
+        self._messages.append({
+            "id": uuid.uuid4(),
+            "session_id": session_id,
+            "role": role,
+            "content": content,
+            "created_at": datetime.utcnow(),
+        })
+        await self._queued()
+
+    async def patch_session(self, db: Optional[AsyncSession], session_id: uuid.UUID, patch: dict) -> None:
+        """
+        Merge `patch` into the session's metadata (top-level keys replaced).
+        """
+        if not self.enabled:
+            # Pending rows (a new session) must be written before the UPDATE
+            await db.flush()
+            await db.execute(_patch_statement(), [{"session_id": session_id, "patch": patch}])
+            return
+        self._patches[session_id] = {**self._patches.get(session_id, {}), **patch}
+        await self._queued()
+
+    async def wait_for_room(self) -> bool:
+        """
+        Backpressure, called by a turn before it acquires a connection: wait
+        until fewer than CHAT_WRITE_MAX_PENDING rows are queued. Returns
+        False when the queue did not drain within CHAT_WRITE_MAX_WAIT_SECONDS.
+        """
+        if not self.enabled:
+            return True
+        if self._task is None:
+            await self.start()
+        deadline = time.monotonic() + settings.CHAT_WRITE_MAX_WAIT_SECONDS
+        while self.pending() >= settings.CHAT_WRITE_MAX_PENDING:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._drained.clear()
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._drained.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+        return True
+
+    async def _queued(self) -> None:
+        if self._task is None:
+            await self.start()
+        if self.pending() >= settings.CHAT_WRITE_BATCH_ROWS:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.CHAT_WRITE_FLUSH_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self.pending():
+                await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Write everything queued in one transaction. On failure the rows are
+        queued again, in front of newer ones.
+        """
+        async with self._flush_lock:
+            sessions, self._sessions = self._sessions, []
+            messages, self._messages = self._messages, []
+            patches, self._patches = self._patches, {}
+            rows = len(sessions) + len(messages) + len(patches)
+            if not rows:
+                return
+            start = time.perf_counter()
+            try:
+                await self._write(sessions, messages, patches)
+            except (IntegrityError, DataError) as e:
+                # Rows the database rejects (e.g. a message of a session
+                # deleted meanwhile) must not lose the whole batch
+                self.failures += 1
+                logger.error(f"Chat write buffer flush of {rows} rows rejected, writing per session: {e}")
+                await self._write_per_session(sessions, messages, patches)
+                self._unflushed_sessions.difference_update(row["id"] for row in sessions)
+                self._drained.set()
+                return
+            except Exception as e:
+                # Database unavailable: keep the rows, in front of newer ones
+                self.failures += 1
+                logger.warning(f"Chat write buffer flush of {rows} rows failed, retrying: {e}")
+                self._sessions[:0] = sessions
+                self._messages[:0] = messages
+                for session_id, patch in patches.items():
+                    self._patches[session_id] = {**patch, **self._patches.get(session_id, {})}
+                return
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._unflushed_sessions.difference_update(row["id"] for row in sessions)
+            self.flushes += 1
+            self.rows_flushed += rows
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._flush_ms_total += elapsed_ms
+            self._drained.set()
+
+    async def _write(self, sessions: List[dict], messages: List[dict], patches: Dict[uuid.UUID, dict]) -> None:
+        async with AsyncSessionLocal() as db:
+            # Sessions before the messages and patches referring to them
+            if sessions:
+                await db.execute(insert(ChatSession), sessions)
+            if messages:
+                await db.execute(insert(ChatMessage), messages)
+            if patches:
+                await db.execute(
+                    _patch_statement(),
+                    [{"session_id": session_id, "patch": patch} for session_id, patch in patches.items()],
+                )
+            await db.commit()
+
+    async def _write_per_session(
+        self, sessions: List[dict], messages: List[dict], patches: Dict[uuid.UUID, dict]
+    ) -> None:
+        """
+        Write each session's rows in their own transaction, dropping the
+        sessions whose rows fail.
+        """
+        groups: Dict[uuid.UUID, tuple] = {}
+        for row in sessions:
+            groups.setdefault(row["id"], ([], [], {}))[0].append(row)
+        for row in messages:
+            groups.setdefault(row["session_id"], ([], [], {}))[1].append(row)
+        for session_id, patch in patches.items():
+            groups.setdefault(session_id, ([], [], {}))[2][session_id] = patch
+        for session_id, (group_sessions, group_messages, group_patches) in groups.items():
+            rows = len(group_sessions) + len(group_messages) + len(group_patches)
+            try:
+                await self._write(group_sessions, group_messages, group_patches)
+                self.rows_flushed += rows
+            except Exception as e:
+                logger.error(f"Dropping {rows} chat rows of session {session_id}: {e}")
+                self.rows_dropped += rows
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self.pending(),
+            "queued_sessions": len(self._sessions),
+            "queued_messages": len(self._messages),
+            "queued_patches": len(self._patches),
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "failures": self.failures,
+            "rows_dropped": self.rows_dropped,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self._flush_ms_total / self.flushes, 2) if self.flushes else 0.0,
+        }
+
+chat_writer = ChatWriter()
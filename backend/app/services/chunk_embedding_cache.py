@@ -0,0 +1,53 @@
+import logging
+from typing import Dict, List, Sequence
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import ChunkEmbedding
+
+logger = logging.getLogger(__name__)
+
+class ChunkEmbeddingCache:
+    """
+    Persistent embedding cache for ingestion, keyed by (embedding model id,
+    chunk content hash) and shared by all projects, so boilerplate that
+    several tenants ingest is only sent through the model once.
+    """
+    async def lookup(self, db: AsyncSession, model_id: str, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        if not hashes:
+            return {}
+        result = await db.execute(
+            select(ChunkEmbedding.content_hash, ChunkEmbedding.embedding).where(
+                ChunkEmbedding.model_id == model_id,
+                ChunkEmbedding.content_hash.in_(set(hashes)),
+            )
+        )
+        return {chunk_hash: embedding for chunk_hash, embedding in result.all()}
+
+    async def fill(self, model_id: str, vectors: Dict[str, List[float]]) -> None:
+        """
+        Store new embeddings in their own short transaction, not the
+        caller's: a long ingestion transaction would hold the unique index
+        entries, making other jobs (any tenant) inserting the same hashes
+        wait for it. Rows go in content_hash order, so concurrent fills
+        cannot deadlock. A failure is logged; the entries are just missing.
+        """
+        if not vectors:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                # ON CONFLICT: concurrent jobs may embed the same chunk
+                await db.execute(
+                    insert(ChunkEmbedding)
+                    .values([
+                        {"model_id": model_id, "content_hash": chunk_hash, "embedding": vectors[chunk_hash]}
+                        for chunk_hash in sorted(vectors)
+                    ])
+                    .on_conflict_do_nothing(index_elements=["model_id", "content_hash"])
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Embedding cache fill of {len(vectors)} chunks failed: {e}")
+
+chunk_embedding_cache = ChunkEmbeddingCache()
@@ -0,0 +1,137 @@
+import asyncio
+import codecs
+import hashlib
+import re
+from collections import deque
+from typing import AsyncIterator, BinaryIO, Deque, Dict, List, Optional, Tuple
+from langchain_core.documents import Document as TextChunk
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from app.services.cpu_pool import run_cpu
+
+# Bytes read from a file per step when streaming
+READ_BLOCK_SIZE = 64 * 1024
+# ASCII whitespace only, so the documents.content_hash backfill can match it in SQL
+_WHITESPACE = re.compile(r"[ \t\n\r\f\v]+")
+
+def content_hash(text: str) -> str:
+    """
+    sha256 hex digest of the chunk text with whitespace runs collapsed.
+    """
+    normalized = _WHITESPACE.sub(" ", text).strip(" ")
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+async def read_text_blocks(file: BinaryIO, block_size: int = READ_BLOCK_SIZE) -> AsyncIterator[str]:
+    """
+    Read a binary file incrementally and decode it as UTF-8 block by block.
+    Raises UnicodeDecodeError on invalid input.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        data = await asyncio.to_thread(file.read, block_size)
+        if not data:
+            break
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+# Preferred cut points between sections, most to least natural
+_SECTION_SEPARATORS = ("\n\n", "\n", " ")
+# Splitters built inside pool processes, by (chunk_size, chunk_overlap)
+_splitters: Dict[Tuple[int, int], RecursiveCharacterTextSplitter] = {}
+
+def split_section(text: str, chunk_size: int, chunk_overlap: int) -> List[Tuple[int, str]]:
+    """
+    Split one section of text into (start offset, chunk); runs in the CPU pool.
+    """
+    key = (chunk_size, chunk_overlap)
+    splitter = _splitters.get(key)
+    if splitter is None:
+        splitter = _splitters[key] = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+        )
+    pieces = []
+    search_from = 0
+    for piece in splitter.split_text(text):
+        start = text.find(piece, search_from)
+        if start == -1:
+            start = text.find(piece)
+        pieces.append((start, piece))
+        search_from = start + 1
+    return pieces
+
+def _section_end(buffer: str, window: int) -> int:
+    # Cut at the last paragraph, line or word break in the second half of the window
+    for separator in _SECTION_SEPARATORS:
+        position = buffer.rfind(separator, window // 2, window)
+        if position != -1:
+            return position + len(separator)
+    return window
+
+def _overlap_start(buffer: str, end: int, overlap: int) -> int:
+    # Start of the text carried into the next section, at a word break
+    start = max(end - overlap, 0)
+    match = _WHITESPACE.search(buffer, start, end)
+    return match.end() if match and match.end() < end else start
+
+class StreamingTextSplitter:
+    """
+    Splits a text stream with bounded memory and on several cores. The
+    stream is cut into sections of about section_chunks chunks at paragraph
+    (or line, or word) breaks, and up to `parallelism` sections are split at
+    once in the CPU pool; chunks are yielded in document order with their
+    character offset in metadata["start_index"]. The last chunk_overlap
+    characters of a section are split again at the start of the next one,
+    so chunks overlap across section boundaries as they do within sections.
+    """
+    def __init__(self, chunk_size: int, chunk_overlap: int, section_chunks: int = 64, parallelism: int = 1):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.window = chunk_size * section_chunks
+        self.parallelism = max(1, parallelism)
+
+    def _submit(self, section: str) -> asyncio.Future:
+        return asyncio.ensure_future(run_cpu(split_section, section, self.chunk_size, self.chunk_overlap))
+
+    async def split(self, blocks: AsyncIterator[str], metadata: Optional[dict] = None) -> AsyncIterator[TextChunk]:
+        # (section offset in the document, split future)
+        pending: Deque[Tuple[int, asyncio.Future]] = deque()
+        buffer = ""
+        offset = 0
+
+        def chunks(base: int, pieces: List[Tuple[int, str]]) -> List[TextChunk]:
+            return [
+                TextChunk(page_content=piece, metadata={**(metadata or {}), "start_index": base + start})
+                for start, piece in pieces
+            ]
+
+        try:
+            async for block in blocks:
+                buffer += block
+                while len(buffer) >= self.window:
+                    end = _section_end(buffer, self.window)
+                    pending.append((offset, self._submit(buffer[:end])))
+                    next_start = _overlap_start(buffer, end, self.chunk_overlap)
+                    buffer = buffer[next_start:]
+                    offset += next_start
+                    while len(pending) >= self.parallelism:
+                        base, future = pending.popleft()
+                        for chunk in chunks(base, await future):
+                            yield chunk
+            if buffer:
+                pending.append((offset, self._submit(buffer)))
+            while pending:
+                base, future = pending.popleft()
+                for chunk in chunks(base, await future):
+                    yield chunk
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+async def iterate_text(text: str, block_size: int = READ_BLOCK_SIZE) -> AsyncIterator[str]:
+    for start in range(0, len(text), block_size):
+        yield text[start:start + block_size]
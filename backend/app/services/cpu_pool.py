@@ -0,0 +1,46 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Optional, TypeVar
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# One pool per API worker process, shared by all CPU-bound ingestion steps
+_pool: Optional[ProcessPoolExecutor] = None
+
+def pool_size() -> int:
+    if settings.INGEST_CPU_WORKERS >= 0:
+        return settings.INGEST_CPU_WORKERS
+    # Per API worker process: with several uvicorn workers, one per core each oversubscribes the host
+    return os.cpu_count() or 1
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if _pool is None and pool_size() > 0:
+        # spawn: forking a process that runs the event loop and model threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=pool_size(), mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"Started CPU pool with {pool_size()} processes")
+    return _pool
+
+async def run_cpu(fn: Callable[..., T], *args) -> T:
+    """
+    Run a picklable CPU-bound function in the process pool, off the event
+    loop. With INGEST_CPU_WORKERS=0 it runs in a thread instead.
+    """
+    pool = _get_pool()
+    if pool is None:
+        return await asyncio.to_thread(fn, *args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, partial(fn, *args))
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
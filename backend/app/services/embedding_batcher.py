@@ -0,0 +1,120 @@
+import asyncio
+import itertools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first: chat queries jump ahead of ingestion batches
+QUERY_PRIORITY = 0
+DOCUMENT_PRIORITY = 1
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Dynamic micro-batching in front of an Embeddings model.
+
+    Concurrent callers are queued; a single scheduler task collects requests
+    for up to max_wait_ms (or until max_batch_size texts are waiting) and runs
+    them as one embed_documents call on a dedicated worker thread. Requests
+    that pile up while a batch is encoding form the next batch, so batch size
+    grows with load.
+    """
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-batcher")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._scheduler: Optional[asyncio.Task] = None
+        self._order = itertools.count()
+        self.batches = 0
+        self.texts = 0
+
+    def _ensure_scheduler(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._scheduler is None or self._scheduler.done():
+            self._loop = loop
+            self._queue = asyncio.PriorityQueue()
+            self._scheduler = loop.create_task(self._run())
+
+    async def _submit(self, texts: List[str], priority: int) -> List[List[float]]:
+        self._ensure_scheduler()
+        future = self._loop.create_future()
+        self._queue.put_nowait((priority, next(self._order), texts, future))
+        return await future
+
+    async def _collect(self) -> list:
+        items = [await self._queue.get()]
+        count = len(items[0][2])
+        deadline = self._loop.time() + self.max_wait
+        while count < self.max_batch_size:
+            if self._queue.empty():
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                item = self._queue.get_nowait()
+            items.append(item)
+            count += len(item[2])
+        return items
+
+    async def _run(self) -> None:
+        while True:
+            items = await self._collect()
+            # Callers that gave up (e.g. a closed websocket) are skipped
+            items = [item for item in items if not item[3].done()]
+            if not items:
+                continue
+            texts = [text for item in items for text in item[2]]
+            try:
+                vectors = await self._loop.run_in_executor(self._executor, self.embeddings.embed_documents, texts)
+            except Exception as e:
+                logger.warning(f"Batched embedding of {len(texts)} texts failed: {e}")
+                for item in items:
+                    if not item[3].done():
+                        item[3].set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for item in items:
+                size = len(item[2])
+                if not item[3].done():
+                    item[3].set_result(vectors[offset:offset + size])
+                offset += size
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self._submit([text], QUERY_PRIORITY))[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        parts = [
+            self._submit(texts[i:i + self.max_batch_size], DOCUMENT_PRIORITY)
+            for i in range(0, len(texts), self.max_batch_size)
+        ]
+        vectors: List[List[float]] = []
+        for part in await asyncio.gather(*parts):
+            vectors.extend(part)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import logging
+from array import array
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+from app.core.cache import TTLLRUCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def normalize_query(text: str) -> str:
+    # all-MiniLM-L6-v2 is uncased, so case and whitespace do not change the vector
+    return " ".join(text.lower().split())
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings object with a cache of normalized query text -> vector.
+    Vectors are kept as packed float32 in an in-process LRU/TTL cache and,
+    optionally, in Redis so all workers share them. Document embeddings are
+    passed through untouched.
+    """
+    def __init__(self, embeddings: Embeddings, model_id: str, redis_url: Optional[str] = None):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.local = TTLLRUCache(
+            max_entries=settings.QUERY_EMBEDDING_CACHE_SIZE,
+            max_bytes=settings.QUERY_EMBEDDING_CACHE_MAX_BYTES,
+            ttl_seconds=settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+        )
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.redis_errors = 0
+        self._redis = None
+        if redis_url:
+            import redis.asyncio as aioredis
+            self._redis = aioredis.from_url(redis_url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        # Concurrent misses for the same text share one model call
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _redis_key(self, normalized: str) -> str:
+        digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        return f"converso:qemb:{self.model_id}:{digest}"
+
+    async def _redis_get(self, normalized: str) -> Optional[bytes]:
+        try:
+            packed = await self._redis.get(self._redis_key(normalized))
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Query embedding cache: Redis get failed: {e}")
+            return None
+        if packed is None:
+            self.redis_misses += 1
+        else:
+            self.redis_hits += 1
+        return packed
+
+    async def _redis_set(self, normalized: str, packed: bytes) -> None:
+        try:
+            await self._redis.set(self._redis_key(normalized), packed, ex=settings.QUERY_EMBEDDING_CACHE_TTL_SECONDS)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Query embedding cache: Redis set failed: {e}")
+
+    async def _load(self, normalized: str) -> bytes:
+        packed = await self._redis_get(normalized) if self._redis is not None else None
+        if packed is None:
+            vector = await self.embeddings.aembed_query(normalized)
+            packed = array("f", vector).tobytes()
+            if self._redis is not None:
+                await self._redis_set(normalized, packed)
+        self.local.set(normalized, packed, size=len(packed) + len(normalized))
+        return packed
+
+    @staticmethod
+    def _unpack(packed: bytes) -> List[float]:
+        vector = array("f")
+        vector.frombytes(packed)
+        return vector.tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        normalized = normalize_query(text)
+        packed = self.local.get(normalized)
+        if packed is not None:
+            return self._unpack(packed)
+
+        inflight = self._inflight.get(normalized)
+        if inflight is not None:
+            try:
+                return self._unpack(await asyncio.shield(inflight))
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The caller that owned the load was cancelled; load it ourselves
+                return self._unpack(await self._load(normalized))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[normalized] = future
+        try:
+            packed = await self._load(normalized)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve the exception so a future nobody awaited does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(packed)
+        finally:
+            self._inflight.pop(normalized, None)
+        return self._unpack(packed)
+
+    def embed_query(self, text: str) -> List[float]:
+        normalized = normalize_query(text)
+        packed = self.local.get(normalized)
+        if packed is None:
+            packed = array("f", self.embeddings.embed_query(normalized)).tobytes()
+            self.local.set(normalized, packed, size=len(packed) + len(normalized))
+        return self._unpack(packed)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def stats(self) -> dict:
+        stats = self.local.stats()
+        if self._redis is not None:
+            stats["redis"] = {
+                "hits": self.redis_hits,
+                "misses": self.redis_misses,
+                "errors": self.redis_errors,
+            }
+        return stats
@@ -0,0 +1,218 @@
+"""
+Out-of-process embedding server and its client.
+
+The server owns the embedding model and batches requests from all uvicorn
+workers; workers use SidecarEmbeddings (EMBEDDING_PROVIDER=sidecar) instead
+of loading their own copy of the model.
+
+Run it with:
+    python -m app.services.embedding_sidecar [--url unix:///tmp/converso-embeddings.sock] [--provider local|hashing]
+
+Wire format (little-endian), one request/response pair at a time per connection:
+    request:  uint8 kind (0 query, 1 documents), uint32 count, count x (uint32 length, utf-8 bytes)
+    response: uint8 status (0 ok), uint32 count, uint32 dim, count*dim float32
+              uint8 status (1 error), uint32 length, utf-8 message
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import struct
+import sys
+from array import array
+from typing import List, Tuple
+from urllib.parse import urlparse
+from langchain_core.embeddings import Embeddings
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+KIND_QUERY = 0
+KIND_DOCUMENTS = 1
+STATUS_OK = 0
+STATUS_ERROR = 1
+# Texts per request; larger document lists are split by the client
+MAX_TEXTS_PER_REQUEST = 256
+
+_HEADER = struct.Struct("<BI")
+_LENGTH = struct.Struct("<I")
+_SHAPE = struct.Struct("<II")
+
+def parse_address(url: str) -> Tuple[str, object]:
+    """
+    "unix:///path/to.sock" -> ("unix", path); "tcp://host:port" -> ("tcp", (host, port)).
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return "unix", parsed.path
+    if parsed.scheme == "tcp":
+        return "tcp", (parsed.hostname or "127.0.0.1", parsed.port or 8765)
+    raise ValueError(f"Unsupported embedding sidecar URL: {url}")
+
+def _pack_floats(vectors: List[List[float]]) -> bytes:
+    flat = array("f", (value for vector in vectors for value in vector))
+    if sys.byteorder != "little":
+        flat.byteswap()
+    return flat.tobytes()
+
+def _unpack_floats(payload: bytes, count: int, dim: int) -> List[List[float]]:
+    flat = array("f")
+    flat.frombytes(payload)
+    if sys.byteorder != "little":
+        flat.byteswap()
+    values = flat.tolist()
+    return [values[i * dim:(i + 1) * dim] for i in range(count)]
+
+def encode_request(kind: int, texts: List[str]) -> bytes:
+    parts = [_HEADER.pack(kind, len(texts))]
+    for text in texts:
+        encoded = text.encode("utf-8")
+        parts.append(_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    return b"".join(parts)
+
+def encode_response(vectors: List[List[float]]) -> bytes:
+    dim = len(vectors[0]) if vectors else 0
+    return bytes([STATUS_OK]) + _SHAPE.pack(len(vectors), dim) + _pack_floats(vectors)
+
+def encode_error(message: str) -> bytes:
+    encoded = message.encode("utf-8")
+    return bytes([STATUS_ERROR]) + _LENGTH.pack(len(encoded)) + encoded
+
+# --- Client -----------------------------------------------------------------
+
+class SidecarEmbeddings(Embeddings):
+    """
+    Embeddings provider backed by the embedding sidecar process.
+    """
+    def __init__(self, url: str, timeout: float = 30.0):
+        self.url = url
+        self.family, self.address = parse_address(url)
+        self.timeout = timeout
+
+    async def _open(self):
+        if self.family == "unix":
+            return await asyncio.open_unix_connection(self.address)
+        host, port = self.address
+        return await asyncio.open_connection(host, port)
+
+    async def _arequest(self, kind: int, texts: List[str]) -> List[List[float]]:
+        reader, writer = await asyncio.wait_for(self._open(), self.timeout)
+        try:
+            writer.write(encode_request(kind, texts))
+            await writer.drain()
+            status = (await asyncio.wait_for(reader.readexactly(1), self.timeout))[0]
+            if status != STATUS_OK:
+                (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                raise RuntimeError(f"Embedding sidecar error: {(await reader.readexactly(length)).decode('utf-8')}")
+            count, dim = _SHAPE.unpack(await reader.readexactly(_SHAPE.size))
+            payload = await asyncio.wait_for(reader.readexactly(count * dim * 4), self.timeout)
+            return _unpack_floats(payload, count, dim)
+        finally:
+            writer.close()
+
+    def _request(self, kind: int, texts: List[str]) -> List[List[float]]:
+        family = socket.AF_UNIX if self.family == "unix" else socket.AF_INET
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.address)
+            sock.sendall(encode_request(kind, texts))
+            reader = sock.makefile("rb")
+            status = reader.read(1)[0]
+            if status != STATUS_OK:
+                (length,) = _LENGTH.unpack(reader.read(_LENGTH.size))
+                raise RuntimeError(f"Embedding sidecar error: {reader.read(length).decode('utf-8')}")
+            count, dim = _SHAPE.unpack(reader.read(_SHAPE.size))
+            return _unpack_floats(reader.read(count * dim * 4), count, dim)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self._arequest(KIND_QUERY, [text]))[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), MAX_TEXTS_PER_REQUEST):
+            vectors.extend(await self._arequest(KIND_DOCUMENTS, texts[i:i + MAX_TEXTS_PER_REQUEST]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._request(KIND_QUERY, [text])[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), MAX_TEXTS_PER_REQUEST):
+            vectors.extend(self._request(KIND_DOCUMENTS, texts[i:i + MAX_TEXTS_PER_REQUEST]))
+        return vectors
+
+# --- Server -----------------------------------------------------------------
+
+async def _read_request(reader: asyncio.StreamReader) -> Tuple[int, List[str]]:
+    kind, count = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    texts = []
+    for _ in range(count):
+        (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+        texts.append((await reader.readexactly(length)).decode("utf-8"))
+    return kind, texts
+
+def _make_handler(embeddings: Embeddings):
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    kind, texts = await _read_request(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    if kind == KIND_QUERY:
+                        vectors = [await embeddings.aembed_query(text) for text in texts]
+                    else:
+                        vectors = await embeddings.aembed_documents(texts)
+                    writer.write(encode_response(vectors))
+                except Exception as e:
+                    logger.warning(f"Embedding sidecar request failed: {e}")
+                    writer.write(encode_error(str(e)))
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+    return handle
+
+async def serve(url: str, provider: str) -> None:
+    # Imported here: the factory imports this module for the client side
+    from app.services.embeddings_factory import create_embeddings
+    from app.services.embedding_batcher import BatchingEmbeddings
+
+    embeddings = create_embeddings(provider)
+    if not isinstance(embeddings, BatchingEmbeddings):
+        # Requests from all workers are batched, whatever the model
+        embeddings = BatchingEmbeddings(
+            embeddings,
+            max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+        )
+    # Load the model before accepting connections
+    await asyncio.to_thread(embeddings.embed_documents, ["warmup"])
+    handler = _make_handler(embeddings)
+    family, address = parse_address(url)
+    if family == "unix":
+        if os.path.exists(address):
+            os.unlink(address)
+        server = await asyncio.start_unix_server(handler, path=address)
+    else:
+        host, port = address
+        server = await asyncio.start_server(handler, host, port)
+    logger.info(f"Embedding sidecar ({provider}) listening on {url}")
+    async with server:
+        await server.serve_forever()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Converso embedding sidecar")
+    parser.add_argument("--url", default=settings.EMBEDDING_SIDECAR_URL)
+    parser.add_argument("--provider", default=settings.EMBEDDING_SIDECAR_PROVIDER)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.url, args.provider))
+
+if __name__ == "__main__":
+    main()
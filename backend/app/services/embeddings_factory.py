@@ -1,10 +1,53 @@
+from typing import Optional
 from langchain_core.embeddings import Embeddings
 from langchain_huggingface import HuggingFaceEmbeddings
-from app.services.mock_embeddings import MockEmbeddings
+from app.services.hashing_embeddings import HashingEmbeddings
+from app.services.embedding_batcher import BatchingEmbeddings
+from app.services.embedding_sidecar import SidecarEmbeddings
 from app.core.config import settings
 
-def get_embeddings() -> Embeddings:
-    if settings.EMBEDDING_PROVIDER == "local":
-        return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+# One model per process, shared by RAGService and IngestionService
+_embeddings: Optional[Embeddings] = None
+
+def get_embedding_model_id() -> str:
+    """
+    Stable identifier of the configured embedding model, used to key caches.
+    """
+    provider = settings.EMBEDDING_PROVIDER
+    if provider == "sidecar":
+        # Vectors come from the sidecar's model, share caches with it
+        provider = settings.EMBEDDING_SIDECAR_PROVIDER
+    if provider == "local":
+        return f"local:{settings.EMBEDDING_MODEL_NAME}"
+    # "mock" and "hashing" are the same deterministic model
+    return "hashing:384:3-5"
+
+def create_embeddings(provider: str) -> Embeddings:
+    if provider == "local":
+        embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL_NAME)
+        if settings.EMBEDDING_BATCHING:
+            embeddings = BatchingEmbeddings(
+                embeddings,
+                max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS,
+            )
+        return embeddings
+    elif provider == "sidecar":
+        return SidecarEmbeddings(settings.EMBEDDING_SIDECAR_URL, timeout=settings.EMBEDDING_SIDECAR_TIMEOUT_SECONDS)
     else:
-        return MockEmbeddings()
+        # "mock" / "hashing": deterministic feature hashing, no model download
+        return HashingEmbeddings()
+
+def get_embeddings() -> Embeddings:
+    global _embeddings
+    if _embeddings is None:
+        _embeddings = create_embeddings(settings.EMBEDDING_PROVIDER)
+    return _embeddings
+
+def embeddings_stats() -> dict:
+    """
+    Batching counters of the shared embeddings, without loading the model.
+    """
+    if isinstance(_embeddings, BatchingEmbeddings):
+        return _embeddings.stats()
+    return {}
@@ -0,0 +1,77 @@
+import asyncio
+from typing import List, Sequence
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_FNV_OFFSET = np.uint64(14695981039346656037)
+_FNV_PRIME = np.uint64(1099511628211)
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic feature-hashing embeddings: hashed character n-grams of the
+    lowercased text, signed and summed into `size` buckets, L2-normalized.
+
+    No model download, identical vectors across processes and runs, and
+    lexical similarity (shared n-grams -> smaller distance), which makes it
+    usable for load tests and CI retrieval tests. A whole batch is embedded
+    with a handful of NumPy operations.
+    """
+    def __init__(self, size: int = 384, ngram_range: Sequence[int] = (3, 4, 5)):
+        self.size = size
+        self.ngram_range = tuple(ngram_range)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        total = len(texts) * self.size
+        out = np.zeros(total + 1, dtype=np.float64)
+        # Pad with spaces so word starts/ends form their own n-grams
+        encoded = [f" {text.lower()} ".encode("utf-8") for text in texts]
+        lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+        owner = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        min_n, max_n = min(self.ngram_range), max(self.ngram_range)
+        # Pad so every window start has max_n bytes; padding belongs to no text
+        pad = max_n - 1
+        data = np.concatenate([
+            np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64),
+            np.zeros(pad, dtype=np.uint64),
+        ])
+        owner = np.concatenate([owner, np.full(pad, -1, dtype=np.int64)])
+        count = data.size - pad
+        starts = owner[:count]
+        base = starts * self.size
+
+        with np.errstate(over="ignore"):
+            # FNV-1a over all windows at once; the hash of an n-gram is the
+            # prefix of the (n+1)-gram hash, so each byte offset is mixed once.
+            hashes = np.full(count, _FNV_OFFSET, dtype=np.uint64)
+            for k in range(max_n):
+                hashes ^= data[k:k + count]
+                hashes *= _FNV_PRIME
+                n = k + 1
+                if n < min_n or n not in self.ngram_range:
+                    continue
+                # Multiply-shift maps the high 32 bits onto [0, size)
+                buckets = (((hashes >> np.uint64(32)) * np.uint64(self.size)) >> np.uint64(32)).astype(np.int64)
+                # n-grams spanning two texts (or the padding) go to a discarded slot
+                index = np.where(starts == owner[k:k + count], base + buckets, total)
+                signs = (hashes & np.uint64(1)).astype(np.float64) * 2.0 - 1.0
+                out += np.bincount(index, weights=signs, minlength=total + 1)
+
+        vectors = out[:total].reshape(len(texts), self.size)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Large ingestion batches take tens of milliseconds, keep them off the event loop
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
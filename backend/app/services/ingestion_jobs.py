@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import BinaryIO, List, Optional
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import IngestionJob
+from app.services.bulk_ingestion import BULK_FORMATS
+from app.services.ingestion_service import ingestion_service
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between progress writes of a running job
+_PROGRESS_INTERVAL = 1.0
+
+class IngestionJobQueue:
+    """
+    Background ingestion. Endpoints spool the payload to INGEST_SPOOL_DIR,
+    record an IngestionJob row and return its id; INGEST_WORKERS asyncio
+    tasks in this process pick jobs up, run them through IngestionService
+    and keep the row's progress counters up to date, so any worker can
+    answer status requests. Jobs interrupted by a worker shutdown are queued
+    again, and jobs left running by a crashed worker are requeued on startup
+    once their heartbeat is stale; an interrupted append job may then insert
+    again the rows it had committed.
+    """
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def _spool_path(self, job_id: uuid.UUID) -> str:
+        os.makedirs(settings.INGEST_SPOOL_DIR, exist_ok=True)
+        return os.path.join(settings.INGEST_SPOOL_DIR, f"{job_id}.txt")
+
+    async def _create(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        job_id: uuid.UUID,
+        payload_path: str,
+        source: Optional[str],
+        metadata: Optional[dict],
+        mode: str,
+        kind: str = "document",
+    ) -> IngestionJob:
+        job = IngestionJob(
+            id=job_id,
+            project_id=project_id,
+            status="queued",
+            kind=kind,
+            mode=mode,
+            source=source,
+            metadata_=metadata or {},
+            payload_path=payload_path,
+        )
+        db.add(job)
+        await db.commit()
+        self._enqueue(job.id)
+        return job
+
+    async def submit_text(
+        self, db: AsyncSession, project_id: uuid.UUID, text: str, metadata: Optional[dict] = None, mode: str = "append"
+    ) -> IngestionJob:
+        job_id = uuid.uuid4()
+        path = self._spool_path(job_id)
+
+        def _write() -> None:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+
+        await asyncio.to_thread(_write)
+        return await self._create(db, project_id, job_id, path, (metadata or {}).get("source"), metadata, mode)
+
+    async def submit_file(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        file: BinaryIO,
+        metadata: Optional[dict] = None,
+        mode: str = "append",
+        kind: str = "document",
+    ) -> IngestionJob:
+        """
+        Spool an uploaded file without reading it into memory. Raises
+        HTTPException(413) past INGEST_MAX_FILE_BYTES. kind is "document"
+        (UTF-8 text), "pdf" or a bulk format ("jsonl", "zip").
+        """
+        job_id = uuid.uuid4()
+        path = self._spool_path(job_id)
+        limit = settings.INGEST_MAX_FILE_BYTES
+
+        def _write() -> bool:
+            file.seek(0)
+            written = 0
+            with open(path, "wb") as f:
+                while True:
+                    block = file.read(1024 * 1024)
+                    if not block:
+                        return True
+                    written += len(block)
+                    if limit and written > limit:
+                        return False
+                    f.write(block)
+
+        if not await asyncio.to_thread(_write):
+            os.unlink(path)
+            raise HTTPException(status_code=413, detail="File too large")
+        return await self._create(db, project_id, job_id, path, (metadata or {}).get("source"), metadata, mode, kind)
+
+    def _enqueue(self, job_id: uuid.UUID) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._queue.put_nowait(job_id)
+
+    async def _update(self, job_id: uuid.UUID, **values) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(IngestionJob).where(IngestionJob.id == job_id).values(**values))
+            await db.commit()
+
+    async def _claim(self, job_id: uuid.UUID) -> Optional[IngestionJob]:
+        """
+        Atomically move a queued job to running; None if another worker has it.
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(IngestionJob)
+                .where(IngestionJob.id == job_id, IngestionJob.status == "queued")
+                .values(status="running", started_at=datetime.utcnow(), heartbeat_at=datetime.utcnow())
+                .returning(IngestionJob)
+            )
+            job = result.scalars().first()
+            await db.commit()
+            return job
+
+    async def _run(self, job_id: uuid.UUID) -> None:
+        job = await self._claim(job_id)
+        if job is None:
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        last_write = 0.0
+        counters: dict = {}
+
+        async def progress(**values) -> None:
+            nonlocal last_write
+            counters.update(values)
+            now = time.monotonic()
+            if now - last_write >= _PROGRESS_INTERVAL:
+                last_write = now
+                await self._update(job_id, **counters)
+
+        # Per-item outcomes of bulk jobs, written when the job ends
+        results: List[dict] = []
+        final = {"results": results} if job.kind in BULK_FORMATS else {}
+        requeued = False
+        try:
+            if job.kind in BULK_FORMATS:
+                async with AsyncSessionLocal() as db:
+                    count = await ingestion_service.ingest_bulk(
+                        db, job.project_id, job.payload_path, job.kind, results, progress=progress,
+                        sync=job.mode == "sync",
+                    )
+            elif job.kind == "pdf":
+                async with AsyncSessionLocal() as db:
+                    count = await ingestion_service.ingest_pdf(
+                        db, job.project_id, job.payload_path, metadata=job.metadata_, progress=progress,
+                        sync=job.mode == "sync",
+                    )
+            else:
+                with open(job.payload_path, "rb") as payload:
+                    async with AsyncSessionLocal() as db:
+                        count = await ingestion_service.ingest_file(
+                            db, job.project_id, payload, metadata=job.metadata_, progress=progress,
+                            sync=job.mode == "sync",
+                        )
+            await self._update(job_id, status="completed", finished_at=datetime.utcnow(), **counters, **final)
+            logger.info(f"Ingestion job {job_id} completed: {count} chunks")
+        except asyncio.CancelledError:
+            # Worker shutdown (e.g. a redeploy): queued again, the payload is
+            # kept for the next start on this disk
+            requeued = True
+            await self._update(job_id, status="queued", **counters)
+            logger.warning(f"Ingestion job {job_id} interrupted by worker shutdown, requeued")
+            raise
+        except UnicodeDecodeError:
+            await self._update(job_id, status="failed", error="Only UTF-8 text files are supported", finished_at=datetime.utcnow(), **counters, **final)
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {e}")
+            await self._update(job_id, status="failed", error=str(e), finished_at=datetime.utcnow(), **counters, **final)
+        finally:
+            heartbeat.cancel()
+            if not requeued and job.payload_path and os.path.exists(job.payload_path):
+                os.unlink(job.payload_path)
+
+    async def _heartbeat(self, job_id: uuid.UUID) -> None:
+        while True:
+            await asyncio.sleep(settings.INGEST_JOB_HEARTBEAT_SECONDS)
+            try:
+                await self._update(job_id, heartbeat_at=datetime.utcnow())
+            except Exception as e:
+                logger.warning(f"Ingestion job {job_id} heartbeat failed: {e}")
+
+    async def _requeue_stale(self, db: AsyncSession) -> None:
+        """
+        Put running jobs whose worker stopped heartbeating back in the
+        queued state, if their payload is on this disk.
+        """
+        stale_before = datetime.utcnow() - timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+        stale = (
+            IngestionJob.status == "running",
+            func.coalesce(IngestionJob.heartbeat_at, IngestionJob.started_at) < stale_before,
+        )
+        result = await db.execute(select(IngestionJob.id, IngestionJob.payload_path).where(*stale))
+        local = [job_id for job_id, payload_path in result.all() if payload_path and os.path.exists(payload_path)]
+        if not local:
+            return
+        # Conditional, so only one starting worker requeues a job
+        result = await db.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id.in_(local), *stale)
+            .values(status="queued")
+            .returning(IngestionJob.id)
+        )
+        requeued = result.scalars().all()
+        await db.commit()
+        if requeued:
+            logger.warning(f"Requeued {len(requeued)} ingestion jobs left running by a stopped worker")
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Ingestion worker error on job {job_id}: {e}")
+
+    async def start(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        # Pick up jobs queued (or left running) before a restart whose payload is on this disk
+        try:
+            async with AsyncSessionLocal() as db:
+                await self._requeue_stale(db)
+                result = await db.execute(
+                    select(IngestionJob.id, IngestionJob.payload_path).where(IngestionJob.status == "queued")
+                )
+                for job_id, payload_path in result.all():
+                    if payload_path and os.path.exists(payload_path):
+                        self._enqueue(job_id)
+        except Exception as e:
+            logger.warning(f"Could not requeue pending ingestion jobs: {e}")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(settings.INGEST_WORKERS)]
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "workers": len(self._workers),
+        }
+
+ingestion_jobs = IngestionJobQueue()
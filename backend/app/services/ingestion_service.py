@@ -1,26 +1,195 @@
+import asyncio
+import hashlib
+import logging
 import uuid
-from typing import List
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Deque, Dict, List, Optional, Sequence, Set, Tuple
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import bindparam, func, select, insert, delete
+from sqlalchemy.dialects.postgresql import JSONB
 from app.models.all_models import Document, Project
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document as TextChunk
 from app.core.config import settings
-from app.services.embeddings_factory import get_embeddings
+from app.db import copy as pg_copy
+from app.services.bulk_ingestion import bulk_chunks
+from app.services.chunking import StreamingTextSplitter, content_hash, iterate_text, read_text_blocks
+from app.services.chunk_embedding_cache import chunk_embedding_cache
+from app.services.embeddings_factory import get_embedding_model_id, get_embeddings
+from app.services.answer_cache import answer_cache
+from app.services.cpu_pool import pool_size
+from app.services.minhash import LSHIndex
+from app.services.near_duplicates import near_duplicate_filter
+from app.services.pdf_extraction import pdf_chunks
+from app.services.rag_service import bump_corpus_version
+from app.services.vector_store import vector_store
+
+logger = logging.getLogger(__name__)
+
+# Column order and binary encoders for COPY into documents
+_DOCUMENT_COPY_COLUMNS = [
+    "id", "project_id", "content", "metadata", "embedding", "content_hash", "minhash", "lsh_bands", "created_at",
+]
+_DOCUMENT_COPY_ENCODERS = [
+    pg_copy.encode_uuid,
+    pg_copy.encode_uuid,
+    pg_copy.encode_text,
+    pg_copy.encode_jsonb,
+    pg_copy.encode_vector,
+    pg_copy.encode_text,
+    pg_copy.encode_bytea,
+    pg_copy.encode_bigint_array,
+    pg_copy.encode_timestamp,
+]
+# Stale document ids deleted per statement in sync mode
+_DELETE_BATCH_SIZE = 1000
+
+_documents_table = Document.__table__
+# Metadata of a kept chunk refreshed in sync mode; executemany-able
+_REFRESH_METADATA = _documents_table.update().where(
+    _documents_table.c.project_id == bindparam("doc_project_id"),
+    _documents_table.c.id == bindparam("doc_id"),
+).values(metadata=bindparam("new_metadata", type_=JSONB))
+
+def _sync_lock_key(project_id: uuid.UUID) -> int:
+    """
+    Advisory lock key serializing the sync ingestions of a project.
+    """
+    digest = hashlib.blake2b(f"sync:{project_id}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+class _Batch:
+    """
+    A batch of chunks moving through the ingestion pipeline.
+    """
+    def __init__(self, chunks: List[TextChunk], hashes: List[str]):
+        self.chunks = chunks
+        self.hashes = hashes
+        self.minhashes: Optional[List[bytes]] = None
+        self.bands: Optional[List[List[int]]] = None
+        # Near-duplicate index of the batch while it is not written yet
+        self.index: Optional[LSHIndex] = None
+        self.cached: Dict[str, List[float]] = {}
+        # Task resolving to content_hash -> vector for the chunks not cached
+        self.embedding: Optional[asyncio.Task] = None
 
 class IngestionService:
     def __init__(self):
         # Lazy init embeddings to avoid network calls during app import
         self.embeddings = None
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
+        self.splitter = StreamingTextSplitter(chunk_size=1000, chunk_overlap=200, parallelism=pool_size())
+
+    async def _write_batch(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        chunks: List[TextChunk],
+        vectors: List[List[float]],
+        hashes: List[str],
+        minhashes: Optional[List[bytes]] = None,
+        bands: Optional[List[List[int]]] = None,
+    ) -> int:
+        """
+        Write one batch of chunks without building ORM objects.
+        """
+        if not chunks:
+            return 0
+        now = datetime.utcnow()
+        minhashes = minhashes or [None] * len(chunks)
+        bands = bands or [None] * len(chunks)
+        if settings.INGEST_BULK_MODE == "copy":
+            rows = [
+                (uuid.uuid4(), project_id, chunk.page_content, chunk.metadata, vector, chunk_hash, minhash, chunk_bands, now)
+                for chunk, vector, chunk_hash, minhash, chunk_bands in zip(chunks, vectors, hashes, minhashes, bands)
+            ]
+            return await pg_copy.copy_rows(db, Document.__tablename__, _DOCUMENT_COPY_COLUMNS, _DOCUMENT_COPY_ENCODERS, rows)
+
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "project_id": project_id,
+                "content": chunk.page_content,
+                "metadata_": chunk.metadata,
+                "embedding": vector,
+                "content_hash": chunk_hash,
+                "minhash": minhash,
+                "lsh_bands": chunk_bands,
+                "created_at": now,
+            }
+            for chunk, vector, chunk_hash, minhash, chunk_bands in zip(chunks, vectors, hashes, minhashes, bands)
+        ]
+        await db.execute(insert(Document), rows)
+        return len(rows)
+
+    async def _existing_chunks(
+        self, db: AsyncSession, project_id: uuid.UUID, source: str
+    ) -> Dict[str, List[Tuple[uuid.UUID, dict]]]:
+        """
+        content_hash -> (document id, metadata) currently stored for a source.
+        """
+        result = await db.execute(
+            select(Document.id, Document.content_hash, Document.metadata_).where(
+                Document.project_id == project_id,
+                Document.metadata_["source"].astext == source,
+            )
         )
+        existing: Dict[str, List[Tuple[uuid.UUID, dict]]] = {}
+        for doc_id, chunk_hash, metadata in result.all():
+            existing.setdefault(chunk_hash, []).append((doc_id, metadata))
+        return existing
 
-    async def ingest_text(self, db: AsyncSession, project_id: uuid.UUID, text: str, metadata: dict = None):
+    async def _embed(self, texts: Dict[str, str], semaphore: asyncio.Semaphore) -> Dict[str, List[float]]:
         """
-        Split text into chunks, generate embeddings, and store in the database.
+        Embed content_hash -> text in INGEST_EMBED_BATCH_SIZE calls, running
+        up to INGEST_EMBED_CONCURRENCY of them at once.
+        """
+        hashes = list(texts.keys())
+        size = settings.INGEST_EMBED_BATCH_SIZE
+
+        async def embed_part(part: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.embeddings.aembed_documents([texts[chunk_hash] for chunk_hash in part])
+
+        parts = [hashes[i:i + size] for i in range(0, len(hashes), size)]
+        results = await asyncio.gather(*(embed_part(part) for part in parts))
+        return {
+            chunk_hash: vector
+            for part, vectors in zip(parts, results)
+            for chunk_hash, vector in zip(part, vectors)
+        }
+
+    async def ingest_chunks(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        chunks: AsyncIterator[TextChunk],
+        progress: Optional[Callable[..., Awaitable[None]]] = None,
+        sync: bool = False,
+        sync_sources: Sequence[str] = (),
+    ) -> int:
+        """
+        Embed and store a stream of chunks, INGEST_BATCH_SIZE at a time.
+        Batches are pipelined: while one batch is written, up to
+        INGEST_EMBED_AHEAD following batches are already being embedded, so
+        memory stays bounded by a few batches. Rows are committed every
+        INGEST_COMMIT_ROWS; progress, if given, is awaited after each batch
+        with the chunk counters.
+
+        With sync, the chunks are the new full content of their
+        metadata["source"]: chunks whose content hash is already stored for
+        the source are kept (their metadata, e.g. start_index, is updated),
+        only new ones are embedded and inserted, and stored chunks that no
+        longer appear are deleted. A source's stored chunks are loaded when
+        its first chunk arrives, or up front for sync_sources (so a source
+        whose new content is empty is cleared). A sync is one transaction,
+        so retrieval never sees old and new content mixed, and holds one
+        advisory lock per project, so concurrent syncs of a project run one
+        after the other (a lock per source, taken as sources arrive, could
+        deadlock two bulk syncs). Returns the number of rows inserted.
+
+        When the project has a near-duplicate threshold, new chunks that are
+        near-duplicates of stored or earlier chunks are dropped before embedding.
         """
         if self.embeddings is None:
             self.embeddings = get_embeddings()
@@ -29,26 +198,243 @@ class IngestionService:
         if not project:
             raise HTTPException(status_code=404, detail="Project not found")
 
-        # 2. Split text
-        chunks = self.text_splitter.create_documents([text], metadatas=[metadata or {}])
-        
-        # 3. Generate embeddings
-        texts = [chunk.page_content for chunk in chunks]
-        vectors = await self.embeddings.aembed_documents(texts)
-        
-        # 4. Store in DB
-        db_docs = []
-        for i, chunk in enumerate(chunks):
-            doc = Document(
-                project_id=project_id,
-                content=chunk.page_content,
-                metadata_=chunk.metadata,
-                embedding=vectors[i]
+        # source -> content_hash -> stored (document id, metadata) not matched yet
+        existing: Dict[str, Dict[str, List[Tuple[uuid.UUID, dict]]]] = {}
+        # Stored chunks not (yet) matched; a sync may delete them, so they
+        # must not suppress their own replacements
+        pending: Set[uuid.UUID] = set()
+        # Kept chunks whose metadata changed
+        refreshed: List[dict] = []
+
+        if sync:
+            # Held until the sync commits, before any stored chunk is read
+            await db.execute(select(func.pg_advisory_xact_lock(_sync_lock_key(project_id))))
+
+        async def load_source(source: str) -> None:
+            stored = await self._existing_chunks(db, project_id, source)
+            existing[source] = stored
+            pending.update(doc_id for rows in stored.values() for doc_id, _ in rows)
+
+        for source in sync_sources:
+            await load_source(source)
+        near_dup_threshold = near_duplicate_filter.threshold(project)
+
+        # 2. Embed and store in pipelined batches as chunks arrive. The session
+        # is only used from this coroutine; embedding tasks never touch it.
+        counters = {
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+            "chunks_cached": 0,
+            "chunks_suppressed": 0,
+            "chunks_inserted": 0,
+            "chunks_unchanged": 0,
+            "chunks_deleted": 0,
+        }
+        model_id = get_embedding_model_id()
+        semaphore = asyncio.Semaphore(settings.INGEST_EMBED_CONCURRENCY)
+        in_flight: Deque[_Batch] = deque()
+        uncommitted = 0
+
+        async def report() -> None:
+            if progress is not None:
+                await progress(**counters)
+
+        async def prepare(batch: _Batch) -> None:
+            # Drop near-duplicates and look up cached vectors, then start embedding the rest
+            if near_dup_threshold:
+                kept, batch.minhashes, batch.bands, batch.index = await near_duplicate_filter.filter(
+                    db,
+                    project_id,
+                    [chunk.page_content for chunk in batch.chunks],
+                    near_dup_threshold,
+                    ignore_ids=pending,
+                    recent=[other.index for other in in_flight if other.index is not None],
+                )
+                counters["chunks_suppressed"] += len(batch.chunks) - len(kept)
+                batch.chunks = [batch.chunks[position] for position in kept]
+                batch.hashes = [batch.hashes[position] for position in kept]
+            if settings.INGEST_EMBEDDING_CACHE:
+                batch.cached = await chunk_embedding_cache.lookup(db, model_id, batch.hashes)
+            missing: Dict[str, str] = {}
+            for chunk, chunk_hash in zip(batch.chunks, batch.hashes):
+                if chunk_hash not in batch.cached:
+                    missing.setdefault(chunk_hash, chunk.page_content)
+            batch.embedding = asyncio.create_task(self._embed(missing, semaphore))
+
+        async def write(batch: _Batch) -> None:
+            nonlocal uncommitted
+            fresh = await batch.embedding
+            if settings.INGEST_EMBEDDING_CACHE:
+                await chunk_embedding_cache.fill(model_id, fresh)
+            vectors = [fresh[chunk_hash] if chunk_hash in fresh else batch.cached[chunk_hash] for chunk_hash in batch.hashes]
+            counters["chunks_embedded"] += len(vectors)
+            counters["chunks_cached"] += sum(1 for chunk_hash in batch.hashes if chunk_hash not in fresh)
+            count = await self._write_batch(db, project_id, batch.chunks, vectors, batch.hashes, batch.minhashes, batch.bands)
+            counters["chunks_inserted"] += count
+            uncommitted += count
+            if not sync and uncommitted >= settings.INGEST_COMMIT_ROWS:
+                # Committed rows are visible to retrieval, retire cached results
+                await bump_corpus_version(db, project_id)
+                await db.commit()
+                uncommitted = 0
+            await report()
+
+        async def submit(batch: _Batch) -> None:
+            await prepare(batch)
+            in_flight.append(batch)
+            # Write the oldest batch while the newer ones embed
+            while len(in_flight) > settings.INGEST_EMBED_AHEAD:
+                await write(in_flight.popleft())
+
+        try:
+            chunk_batch: List[TextChunk] = []
+            hashes: List[str] = []
+            async for chunk in chunks:
+                counters["chunks_total"] += 1
+                chunk_hash = content_hash(chunk.page_content)
+                source = chunk.metadata.get("source")
+                if sync and source is not None:
+                    source = str(source)
+                    if source not in existing:
+                        await load_source(source)
+                    stored = existing[source].get(chunk_hash)
+                    if stored:
+                        # Unchanged chunk: keep the stored row, with the new offsets
+                        doc_id, metadata = stored.pop()
+                        pending.discard(doc_id)
+                        if metadata != chunk.metadata:
+                            refreshed.append({"doc_project_id": project_id, "doc_id": doc_id, "new_metadata": chunk.metadata})
+                        counters["chunks_unchanged"] += 1
+                        continue
+                chunk_batch.append(chunk)
+                hashes.append(chunk_hash)
+                if len(chunk_batch) >= settings.INGEST_BATCH_SIZE:
+                    await submit(_Batch(chunk_batch, hashes))
+                    chunk_batch, hashes = [], []
+            if chunk_batch:
+                await submit(_Batch(chunk_batch, hashes))
+            while in_flight:
+                await write(in_flight.popleft())
+        finally:
+            for batch in in_flight:
+                batch.embedding.cancel()
+
+        # 3. Update kept chunks' metadata, remove chunks that disappeared from their source
+        for start in range(0, len(refreshed), _DELETE_BATCH_SIZE):
+            await db.execute(_REFRESH_METADATA, refreshed[start:start + _DELETE_BATCH_SIZE])
+        stale = [doc_id for stored in existing.values() for rows in stored.values() for doc_id, _ in rows]
+        for start in range(0, len(stale), _DELETE_BATCH_SIZE):
+            await db.execute(
+                delete(Document).where(
+                    Document.project_id == project_id,
+                    Document.id.in_(stale[start:start + _DELETE_BATCH_SIZE]),
+                )
             )
-            db.add(doc)
-            db_docs.append(doc)
-            
+        counters["chunks_deleted"] = len(stale)
+        await report()
+
+        changed = bool(counters["chunks_inserted"] or stale or refreshed)
+        if changed:
+            # Cached answers and retrieval results may no longer match the knowledge base
+            await answer_cache.invalidate(db, project_id)
+            await bump_corpus_version(db, project_id)
         await db.commit()
-        return len(db_docs)
+        if changed and vector_store.is_enabled(project.rag_config):
+            try:
+                await vector_store.refresh(db, project_id)
+            except Exception as e:
+                # Retrieval brings the store up to date on its next query
+                logger.warning(f"Vector store refresh failed for project {project_id}: {e}")
+        return counters["chunks_inserted"]
+
+    async def ingest_text(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        text: str,
+        metadata: dict = None,
+        progress: Optional[Callable[..., Awaitable[None]]] = None,
+        sync: bool = False,
+    ) -> int:
+        """
+        Split text into chunks, generate embeddings, and store in the database.
+        sync=True replaces the chunks of metadata["source"] incrementally.
+        """
+        chunks = self.splitter.split(iterate_text(text), metadata=metadata)
+        return await self.ingest_chunks(
+            db, project_id, chunks, progress=progress, sync=sync, sync_sources=self._sync_sources(metadata, sync)
+        )
+
+    async def ingest_file(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        file: BinaryIO,
+        metadata: dict = None,
+        progress: Optional[Callable[..., Awaitable[None]]] = None,
+        sync: bool = False,
+    ) -> int:
+        """
+        Ingest a UTF-8 text file with bounded memory: the file is read and
+        decoded incrementally and split section by section in the CPU pool,
+        so peak memory does not depend on the file size.
+        """
+        chunks = self.splitter.split(read_text_blocks(file), metadata=metadata)
+        return await self.ingest_chunks(
+            db, project_id, chunks, progress=progress, sync=sync, sync_sources=self._sync_sources(metadata, sync)
+        )
+
+    async def ingest_pdf(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        path: str,
+        metadata: dict = None,
+        progress: Optional[Callable[..., Awaitable[None]]] = None,
+        sync: bool = False,
+    ) -> int:
+        """
+        Ingest a PDF page by page: page ranges are extracted and split in the
+        CPU pool and stream into the embedding pipeline. Chunks carry their
+        page number in metadata["page"].
+        """
+        chunks = pdf_chunks(
+            path,
+            self.splitter.chunk_size,
+            self.splitter.chunk_overlap,
+            metadata=metadata,
+            pages_per_task=settings.INGEST_PDF_PAGES_PER_TASK,
+            parallelism=self.splitter.parallelism,
+        )
+        return await self.ingest_chunks(
+            db, project_id, chunks, progress=progress, sync=sync, sync_sources=self._sync_sources(metadata, sync)
+        )
+
+    async def ingest_bulk(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        path: str,
+        fmt: str,
+        results: List[dict],
+        progress: Optional[Callable[..., Awaitable[None]]] = None,
+        sync: bool = False,
+    ) -> int:
+        """
+        Ingest every document of a JSONL or zip payload through one pipeline,
+        so small documents share embedding and insert batches. Per-item
+        outcomes are appended to results.
+        """
+        chunks = bulk_chunks(path, fmt, self.splitter, results)
+        return await self.ingest_chunks(db, project_id, chunks, progress=progress, sync=sync)
+
+    @staticmethod
+    def _sync_sources(metadata: Optional[dict], sync: bool) -> List[str]:
+        if not sync:
+            return []
+        source = (metadata or {}).get("source")
+        if not source:
+            raise ValueError("Sync ingestion requires a metadata source")
+        return [str(source)]
 
 ingestion_service = IngestionService()
@@ -0,0 +1,109 @@
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+_SEED = 0x5EED
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles, with LSH band keys.
+
+    A signature is num_perm uint32 minimums of multiply-shift hashes of the
+    chunk's CRC32-hashed word shingles; the fraction of equal positions
+    between two signatures estimates the Jaccard similarity of their shingle
+    sets. Signatures are split into `bands` bands whose hashes are the LSH
+    keys: chunks sharing any band are candidates and are then verified
+    against the threshold. Everything is seeded, so signatures are stable
+    across processes and can be stored.
+    """
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_words: int = 3):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(_SEED)
+        # Odd multipliers for multiply-shift hashing
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def _shingles(self, text: str) -> np.ndarray:
+        words = _WORD.findall(text.lower())
+        n = self.shingle_words
+        if len(words) < n:
+            grams = [" ".join(words)]
+        else:
+            grams = [" ".join(words[i:i + n]) for i in range(len(words) - n + 1)]
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in set(grams)), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = self._shingles(text)
+        with np.errstate(over="ignore"):
+            hashed = (self._a[:, None] * shingles[None, :] + self._b[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray) -> List[int]:
+        keys = []
+        for band in range(self.bands):
+            part = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(part, digest_size=8, person=band.to_bytes(2, "little")).digest()
+            keys.append(int.from_bytes(digest, "little", signed=True))
+        return keys
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.count_nonzero(a == b)) / a.size
+
+    @staticmethod
+    def to_bytes(signature: np.ndarray) -> bytes:
+        return signature.astype("<u4").tobytes()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype="<u4").astype(np.uint32)
+
+# Hashers built inside pool processes, by (num_perm, bands)
+_hashers: Dict[Tuple[int, int], MinHasher] = {}
+
+def compute_signatures(texts: Sequence[str], num_perm: int, bands: int) -> Tuple[List[bytes], List[List[int]]]:
+    """
+    Signatures (as bytes) and band keys of a batch; runs in the CPU pool.
+    """
+    hasher = _hashers.get((num_perm, bands))
+    if hasher is None:
+        hasher = _hashers[(num_perm, bands)] = MinHasher(num_perm=num_perm, bands=bands)
+    signatures = [hasher.signature(text) for text in texts]
+    return [hasher.to_bytes(signature) for signature in signatures], [hasher.band_keys(signature) for signature in signatures]
+
+class LSHIndex:
+    """
+    In-memory LSH index of signatures, for one ingestion batch.
+    """
+    def __init__(self, hasher: MinHasher):
+        self.hasher = hasher
+        self._buckets: Dict[int, List[int]] = {}
+        self._signatures: List[np.ndarray] = []
+
+    def query(self, keys: Sequence[int], signature: np.ndarray, threshold: float) -> Optional[int]:
+        """
+        Position of an indexed signature at least `threshold` similar, or None.
+        """
+        seen = set()
+        for key in keys:
+            for position in self._buckets.get(key, ()):
+                if position in seen:
+                    continue
+                seen.add(position)
+                if self.hasher.similarity(signature, self._signatures[position]) >= threshold:
+                    return position
+        return None
+
+    def add(self, keys: Sequence[int], signature: np.ndarray) -> None:
+        position = len(self._signatures)
+        self._signatures.append(signature)
+        for key in keys:
+            self._buckets.setdefault(key, []).append(position)
@@ -0,0 +1,81 @@
+import uuid
+from typing import Collection, List, Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.all_models import Document, Project
+from app.services.cpu_pool import run_cpu
+from app.services.minhash import LSHIndex, MinHasher, compute_signatures
+
+class NearDuplicateFilter:
+    """
+    Ingest-time near-duplicate suppression. Each chunk's MinHash signature
+    is checked against the project's stored chunks through the GIN-indexed
+    lsh_bands column, and against earlier chunks of the same batch in
+    memory; chunks at or above the Jaccard threshold are dropped before
+    embedding. Earlier batches of the same run are covered by the database
+    lookup once written in the session's transaction, and by their
+    in-memory index (`recent`) while still in the pipeline.
+    """
+    def __init__(self):
+        self.hasher = MinHasher(
+            num_perm=settings.MINHASH_NUM_PERM,
+            bands=settings.MINHASH_BANDS,
+        )
+
+    def threshold(self, project: Project) -> Optional[float]:
+        """
+        Per-project Jaccard threshold (rag_config "near_duplicate_threshold"), None when disabled.
+        """
+        value = (project.rag_config or {}).get("near_duplicate_threshold", settings.INGEST_NEAR_DUP_THRESHOLD)
+        return float(value) if value else None
+
+    async def filter(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        texts: List[str],
+        threshold: float,
+        ignore_ids: Collection[uuid.UUID] = (),
+        recent: Sequence[LSHIndex] = (),
+    ) -> Tuple[List[int], List[bytes], List[List[int]], LSHIndex]:
+        """
+        Positions of the texts to keep, with their signatures and band keys,
+        and the index of the kept ones. Stored documents in ignore_ids (e.g.
+        chunks a sync may delete) do not count.
+        """
+        packed, keys = await run_cpu(compute_signatures, texts, self.hasher.num_perm, self.hasher.bands)
+        signatures = [self.hasher.from_bytes(data) for data in packed]
+
+        all_keys = sorted({key for chunk_keys in keys for key in chunk_keys})
+        result = await db.execute(
+            select(Document.id, Document.minhash, Document.lsh_bands).where(
+                Document.project_id == project_id,
+                Document.lsh_bands.overlap(all_keys),
+            )
+        )
+        stored = LSHIndex(self.hasher)
+        for doc_id, minhash, bands in result.all():
+            if doc_id in ignore_ids or minhash is None:
+                continue
+            stored.add(bands, self.hasher.from_bytes(minhash))
+
+        batch = LSHIndex(self.hasher)
+        kept: List[int] = []
+        for position, (signature, chunk_keys) in enumerate(zip(signatures, keys)):
+            if stored.query(chunk_keys, signature, threshold) is not None:
+                continue
+            if batch.query(chunk_keys, signature, threshold) is not None:
+                continue
+            if any(index.query(chunk_keys, signature, threshold) is not None for index in recent):
+                continue
+            batch.add(chunk_keys, signature)
+            kept.append(position)
+        return (
+            kept,
+            [packed[position] for position in kept],
+            [keys[position] for position in kept],
+            batch,
+        )
+
+near_duplicate_filter = NearDuplicateFilter()
@@ -0,0 +1,62 @@
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional, Tuple
+from langchain_core.documents import Document as TextChunk
+from pypdf import PdfReader
+from app.services.chunking import split_section
+from app.services.cpu_pool import run_cpu
+
+def pdf_page_count(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+def extract_and_split(
+    path: str, start: int, end: int, chunk_size: int, chunk_overlap: int
+) -> List[Tuple[int, List[Tuple[int, str]]]]:
+    """
+    Extract pages [start, end) of a PDF and split each page's text; runs in
+    the CPU pool. Returns (1-based page number, (offset, chunk) list) per page.
+    """
+    reader = PdfReader(path)
+    pages = []
+    for index in range(start, min(end, len(reader.pages))):
+        text = reader.pages[index].extract_text() or ""
+        pages.append((index + 1, split_section(text, chunk_size, chunk_overlap) if text.strip() else []))
+    return pages
+
+async def pdf_chunks(
+    path: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    metadata: Optional[dict] = None,
+    pages_per_task: int = 8,
+    parallelism: int = 1,
+) -> AsyncIterator[TextChunk]:
+    """
+    Chunks of a PDF in page order, tagged with metadata["page"] and their
+    offset in the page's text, metadata["start_index"]. Page ranges
+    are extracted and split in the CPU pool, up to `parallelism` at once, so
+    only a few pages' text is held in memory.
+    """
+    total = await run_cpu(pdf_page_count, path)
+    starts = iter(range(0, total, pages_per_task))
+    pending: Deque[asyncio.Future] = deque()
+
+    def submit_next() -> None:
+        start = next(starts, None)
+        if start is not None:
+            pending.append(asyncio.ensure_future(
+                run_cpu(extract_and_split, path, start, start + pages_per_task, chunk_size, chunk_overlap)
+            ))
+
+    try:
+        for _ in range(max(1, parallelism)):
+            submit_next()
+        while pending:
+            pages = await pending.popleft()
+            submit_next()
+            for page, pieces in pages:
+                for offset, piece in pieces:
+                    yield TextChunk(page_content=piece, metadata={**(metadata or {}), "page": page, "start_index": offset})
+    finally:
+        for future in pending:
+            future.cancel()
@@ -1,44 +1,553 @@
+import json
+import re
+import time
 import uuid
-from typing import List
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.models.all_models import Document
+from sqlalchemy import select, func, update, cast, literal, or_, Row, Select
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from app.models.all_models import Document, Project
+from app.core.cache import TTLLRUCache
 from app.core.config import settings
-from app.services.embeddings_factory import get_embeddings
+from app.services.embeddings_factory import get_embeddings, get_embedding_model_id
+from app.services.embedding_cache import CachedQueryEmbeddings, normalize_query
+from app.services.vector_store import vector_store
+
+# rag_config keys that change retrieval results, part of the result cache key
+_RETRIEVAL_CONFIG_KEYS = (
+    "candidates", "max_distance", "context_token_budget", "ef_search", "exact_search_max_rows",
+    "quantization", "rerank_factor", "iterative_scan", "metadata_filter",
+    "search_mode", "hybrid_candidates", "rrf_k", "hybrid_keep_lexical", "retrieval_backend",
+)
+# Largest number of accepted values for one metadata filter key
+_MAX_FILTER_VALUES = 100
+# Largest hnsw.ef_search pgvector accepts; bounds quantized candidate counts
+_MAX_EF_SEARCH = 1000
+# Largest accepted rag_config rerank_factor
+_MAX_RERANK_FACTOR = 100
+# Accepted pgvector iterative_scan modes for HNSW indexes
+_ITERATIVE_SCAN_MODES = ("off", "relaxed_order", "strict_order")
+
+def metadata_conditions(filters: Optional[dict]) -> list:
+    """
+    SQL conditions for a metadata filter such as
+    {"source": ["a.pdf", "b.pdf"], "language": "en"}: every key must match,
+    a list matches any of its values. Conditions are JSONB containment
+    (@>), served by the GIN index on documents.metadata.
+    Raises ValueError for malformed filters.
+    """
+    if not filters:
+        return []
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    conditions = []
+    for key, value in filters.items():
+        values = value if isinstance(value, list) else [value]
+        if not values or len(values) > _MAX_FILTER_VALUES:
+            raise ValueError(f"Filter '{key}' must have between 1 and {_MAX_FILTER_VALUES} values")
+        if not all(isinstance(v, (str, int, float, bool)) for v in values):
+            raise ValueError(f"Filter '{key}' values must be strings, numbers or booleans")
+        conditions.append(or_(*(Document.metadata_.contains({key: v}) for v in values)))
+    return conditions
+
+# rag_config numeric keys: (type, minimum, maximum or None)
+_CONFIG_RANGES = {
+    "candidates": (int, 1, _MAX_EF_SEARCH),
+    "context_token_budget": (int, 1, 100000),
+    "ef_search": (int, 1, _MAX_EF_SEARCH),
+    "exact_search_max_rows": (int, 0, None),
+    "rerank_factor": (int, 1, _MAX_RERANK_FACTOR),
+    "hybrid_candidates": (int, 1, _MAX_EF_SEARCH),
+    "rrf_k": (int, 1, 10000),
+    "hybrid_keep_lexical": (int, 0, _MAX_EF_SEARCH),
+    "max_distance": (float, 0, None),
+    "semantic_cache_max_distance": (float, 0, 2),
+    "near_duplicate_threshold": (float, 0, 1),
+}
+# rag_config keys with a fixed set of values
+_CONFIG_CHOICES = {
+    "quantization": ("none", "halfvec", "binary"),
+    "search_mode": ("vector", "hybrid"),
+    "retrieval_backend": ("postgres", "memory"),
+    "semantic_cache": (True, False),
+}
+
+def validate_rag_config(config: Optional[dict]) -> None:
+    """
+    Check the types and ranges of known rag_config keys, which would
+    otherwise fail at query time (where a failure means no context).
+    Unknown keys are left alone. Raises ValueError.
+    """
+    if config is None:
+        return
+    if not isinstance(config, dict):
+        raise ValueError("rag_config must be an object")
+    for key, (kind, minimum, maximum) in _CONFIG_RANGES.items():
+        value = config.get(key)
+        if value is None:
+            continue
+        # bool is an int subclass; floats also accept integers
+        accepted = (int,) if kind is int else (int, float)
+        if isinstance(value, bool) or not isinstance(value, accepted):
+            raise ValueError(f"{key} must be {'an integer' if kind is int else 'a number'}")
+        if value < minimum or (maximum is not None and value > maximum):
+            bounds = f"between {minimum} and {maximum}" if maximum is not None else f"at least {minimum}"
+            raise ValueError(f"{key} must be {bounds}")
+    for key, choices in _CONFIG_CHOICES.items():
+        value = config.get(key)
+        if value is not None and (value not in choices or type(value) is not type(choices[0])):
+            raise ValueError(f"{key} must be one of {', '.join(str(choice) for choice in choices)}")
+    try:
+        metadata_conditions(config.get("metadata_filter"))
+    except ValueError as e:
+        raise ValueError(f"Invalid metadata_filter: {e}")
+    iterative_scan = config.get("iterative_scan")
+    if iterative_scan is not None and iterative_scan not in _ITERATIVE_SCAN_MODES:
+        raise ValueError(f"iterative_scan must be one of {', '.join(_ITERATIVE_SCAN_MODES)}")
+
+async def bump_corpus_version(db: AsyncSession, project_id: uuid.UUID) -> None:
+    """
+    Mark the project's documents as changed, in the caller's transaction.
+    Cached retrieval results of older versions are never read again.
+    """
+    await db.execute(
+        update(Project).where(Project.id == project_id).values(corpus_version=Project.corpus_version + 1)
+    )
 
 class RAGService:
     def __init__(self):
         # Lazy init embeddings to avoid network calls during app import
         self.embeddings = None
+        # project_id -> (fetched_at, chunk count), used to choose exact vs ANN search
+        self._chunk_counts: dict[uuid.UUID, tuple[float, int]] = {}
+        # (project_id, corpus_version, normalized query, config) -> context string
+        self._results = TTLLRUCache(
+            max_entries=settings.RETRIEVAL_CACHE_SIZE,
+            max_bytes=settings.RETRIEVAL_CACHE_MAX_BYTES,
+            ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+            sizeof=lambda context: len(context) + 100,
+        )
+
+    def _get_embeddings(self):
+        if self.embeddings is None:
+            embeddings = get_embeddings()
+            if settings.QUERY_EMBEDDING_CACHE_SIZE > 0:
+                embeddings = CachedQueryEmbeddings(
+                    embeddings,
+                    model_id=get_embedding_model_id(),
+                    redis_url=settings.REDIS_URL if settings.QUERY_EMBEDDING_CACHE_REDIS else None,
+                )
+            self.embeddings = embeddings
+        return self.embeddings
 
-    async def retrieve_context(self, db: AsyncSession, project_id: uuid.UUID, query: str, limit: int = 4) -> str:
+    def cache_stats(self) -> dict:
         """
-        Retrieve relevant documents for a query and format them as context.
+        Hit/miss counters of the query embedding cache.
         """
-        if self.embeddings is None:
-            self.embeddings = get_embeddings()
-        # 1. Embed query
-        query_vector = await self.embeddings.aembed_query(query)
-        
-        # 2. Search in DB using pgvector L2 distance
-        # Note: We filter by project_id to ensure multi-tenancy isolation
-        stmt = select(Document).filter(
+        if isinstance(self.embeddings, CachedQueryEmbeddings):
+            return self.embeddings.stats()
+        return {}
+
+    def retrieval_cache_stats(self) -> dict:
+        """
+        Hit rate and memory of the retrieval result cache.
+        """
+        return self._results.stats()
+
+    async def embed_query(self, query: str) -> List[float]:
+        return await self._get_embeddings().aembed_query(query)
+
+    async def _chunk_count(self, db: AsyncSession, project_id: uuid.UUID) -> int:
+        now = time.monotonic()
+        cached = self._chunk_counts.get(project_id)
+        if cached and (now - cached[0]) < settings.VECTOR_ROW_COUNT_TTL_SECONDS:
+            return cached[1]
+        count = (
+            await db.execute(select(func.count(Document.id)).where(Document.project_id == project_id))
+        ).scalar() or 0
+        self._chunk_counts[project_id] = (now, count)
+        return count
+
+    async def _use_exact_search(self, db: AsyncSession, project_id: uuid.UUID, config: dict) -> bool:
+        """
+        Small projects are faster (and exact) with a scan of their own rows
+        through the project_id index than with an ANN index walk.
+        """
+        max_rows = int(config.get("exact_search_max_rows", settings.VECTOR_EXACT_SEARCH_MAX_ROWS))
+        if max_rows <= 0:
+            return False
+        return await self._chunk_count(db, project_id) <= max_rows
+
+    async def _apply_search_params(
+        self,
+        db: AsyncSession,
+        config: dict,
+        limit: int,
+        filtered: bool = False,
+    ) -> None:
+        """
+        Set HNSW search parameters for the current transaction only.
+        """
+        # ef_search bounds the number of candidates returned by the index
+        ef_search = min(max(int(config.get("ef_search", settings.VECTOR_HNSW_EF_SEARCH)), limit), _MAX_EF_SEARCH)
+        await db.execute(select(func.set_config("hnsw.ef_search", str(ef_search), True)))
+        iterative_scan = config.get("iterative_scan", settings.VECTOR_ITERATIVE_SCAN)
+        if filtered and iterative_scan != "off" and iterative_scan in _ITERATIVE_SCAN_MODES:
+            # Keep scanning the index until enough rows pass the filters,
+            # instead of returning the few of the first ef_search that do
+            await db.execute(select(func.set_config("hnsw.iterative_scan", iterative_scan, True)))
+
+    def _conditions(self, project_id: uuid.UUID, config: dict, filters: Optional[dict]) -> list:
+        return (
+            [Document.project_id == project_id]
+            + metadata_conditions(config.get("metadata_filter"))
+            + metadata_conditions(filters)
+        )
+
+    async def search_statement(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        query_vector: List[float],
+        limit: int,
+        config: dict,
+        filters: Optional[dict] = None,
+    ) -> Select:
+        """
+        The search query, with its search parameters applied to the current
+        transaction. Metadata filters (the project's rag_config
+        "metadata_filter" and `filters`) are applied in the same query as
+        the vector ordering.
+        """
+        conditions = self._conditions(project_id, config, filters)
+        filtered = len(conditions) > 1
+        distance = Document.embedding.l2_distance(query_vector)
+        quantization = config.get("quantization", settings.RAG_QUANTIZATION)
+        if await self._use_exact_search(db, project_id, config):
+            # "+ 0" keeps the planner from matching the ANN index, so the
+            # project_id index is used and results are exact.
+            order_by = distance + 0
+        elif quantization in ("halfvec", "binary"):
+            return await self._quantized_statement(
+                db, conditions, query_vector, limit, config, quantization, filtered
+            )
+        else:
+            await self._apply_search_params(db, config, limit, filtered=filtered)
+            order_by = distance
+        return select(
+            Document.id,
+            Document.content,
+            Document.metadata_,
+            distance.label("distance"),
+        ).filter(
+            *conditions
+        ).order_by(
+            order_by
+        ).limit(limit)
+
+    async def hybrid_statement(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        query_vector: List[float],
+        query_text: str,
+        limit: int,
+        config: dict,
+        filters: Optional[dict] = None,
+    ) -> Select:
+        """
+        One query fusing the top candidates of the vector search and of a
+        full-text search on content_tsv with reciprocal rank fusion,
+        score = sum of 1 / (k + rank) over both sides. Rows keep their L2
+        distance; `lexical_rank` is their full-text rank (1 = best), NULL
+        when the full-text side did not match.
+        """
+        candidates = int(config.get("hybrid_candidates", settings.RAG_HYBRID_CANDIDATES))
+        rrf_k = int(config.get("rrf_k", settings.RAG_HYBRID_RRF_K))
+        vector_hits = (await self.search_statement(
+            db, project_id, query_vector, max(candidates, limit), config, filters
+        )).subquery("vector_hits")
+        vector_ranked = select(
+            vector_hits.c.id,
+            func.row_number().over(order_by=vector_hits.c.distance).label("rank"),
+        ).cte("vector_ranked")
+
+        # Any query term may match: the 'english' configuration drops the
+        # question's stop words and ts_rank_cd ranks chunks matching more
+        # (and rarer) terms first, so "what is the price of AB-123?" still
+        # finds the chunk that only mentions AB-123
+        tsquery = func.websearch_to_tsquery("english", lexical_query_text(query_text))
+        text_rank = func.ts_rank_cd(Document.content_tsv, tsquery)
+        lexical_ranked = select(
+            Document.id,
+            func.row_number().over(order_by=text_rank.desc()).label("rank"),
+        ).filter(
+            *self._conditions(project_id, config, filters),
+            Document.content_tsv.op("@@")(tsquery),
+        ).order_by(
+            text_rank.desc()
+        ).limit(candidates).cte("lexical_ranked")
+
+        fused = select(
+            func.coalesce(vector_ranked.c.id, lexical_ranked.c.id).label("id"),
+            (
+                func.coalesce(1.0 / (rrf_k + vector_ranked.c.rank), 0.0)
+                + func.coalesce(1.0 / (rrf_k + lexical_ranked.c.rank), 0.0)
+            ).label("score"),
+            lexical_ranked.c.rank.label("lexical_rank"),
+        ).select_from(
+            vector_ranked.join(lexical_ranked, vector_ranked.c.id == lexical_ranked.c.id, full=True)
+        ).cte("fused")
+        distance = Document.embedding.l2_distance(query_vector)
+        return select(
+            Document.id,
+            Document.content,
+            Document.metadata_,
+            distance.label("distance"),
+            fused.c.lexical_rank,
+        ).join(
+            fused, Document.id == fused.c.id
+        ).filter(
+            # Prunes to the project's documents partition
             Document.project_id == project_id
         ).order_by(
-            Document.embedding.l2_distance(query_vector)
+            fused.c.score.desc(), distance
         ).limit(limit)
-        
+
+    async def search(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        query_vector: List[float],
+        limit: int,
+        config: dict,
+        filters: Optional[dict] = None,
+        query_text: Optional[str] = None,
+    ) -> List[Row]:
+        """
+        Nearest chunks as (id, content, metadata_, distance) rows, closest
+        first. Embeddings are not selected, so no vectors are decoded.
+        With query_text and search mode "hybrid", rows are ranked by fused
+        vector and full-text rank instead, see hybrid_statement.
+        """
+        if query_text and config.get("search_mode", settings.RAG_SEARCH_MODE) == "hybrid":
+            stmt = await self.hybrid_statement(db, project_id, query_vector, query_text, limit, config, filters)
+            result = await db.execute(stmt)
+            return list(result.all())
+        stmt = await self.search_statement(db, project_id, query_vector, limit, config, filters)
         result = await db.execute(stmt)
-        docs = result.scalars().all()
-        
+        # Relaxed-order iterative index scans can return rows slightly out of order
+        return sorted(result.all(), key=lambda row: row.distance)
+
+    async def _quantized_statement(
+        self,
+        db: AsyncSession,
+        conditions: list,
+        query_vector: List[float],
+        limit: int,
+        config: dict,
+        quantization: str,
+        filtered: bool,
+    ) -> Select:
+        """
+        Two-pass search: the halfvec or binary (sign bit, Hamming distance)
+        expression index returns limit * RAG_RERANK_FACTOR candidates, which
+        are re-ranked by full-precision L2 distance. Expressions match the
+        indexes created by migration.
+        """
+        dim = Document.embedding.type.dim
+        query = literal(query_vector, Vector(dim))
+        if quantization == "binary":
+            first_pass = cast(func.binary_quantize(Document.embedding), BIT(dim)).hamming_distance(
+                cast(func.binary_quantize(query), BIT(dim))
+            )
+        else:
+            first_pass = cast(Document.embedding, HALFVEC(dim)).l2_distance(cast(query, HALFVEC(dim)))
+        # An HNSW scan returns at most ef_search rows, which pgvector caps
+        rerank_factor = max(1, int(config.get("rerank_factor", settings.RAG_RERANK_FACTOR)))
+        candidate_count = max(limit, min(limit * rerank_factor, _MAX_EF_SEARCH))
+        await self._apply_search_params(db, config, candidate_count, filtered=filtered)
+        candidates = select(
+            Document.id,
+            Document.content,
+            Document.metadata_,
+            Document.embedding,
+        ).filter(
+            *conditions
+        ).order_by(
+            first_pass
+        ).limit(candidate_count).subquery()
+        distance = candidates.c.embedding.l2_distance(query_vector)
+        return select(
+            candidates.c.id,
+            candidates.c.content,
+            candidates.c.metadata_,
+            distance.label("distance"),
+        ).order_by(distance).limit(limit)
+
+    async def retrieve_context(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        query: str,
+        limit: Optional[int] = None,
+        config: Optional[dict] = None,
+        query_vector: Optional[List[float]] = None,
+        corpus_version: Optional[int] = None,
+        filters: Optional[dict] = None,
+    ) -> str:
+        """
+        Retrieve relevant documents for a query and format them as context.
+        Up to `limit` candidates (RAG_CANDIDATES) within the distance cutoff
+        are merged with overlapping neighbours from the same source and
+        packed, best first, into the context token budget.
+        Pass query_vector if the query was already embedded. With the
+        project's corpus_version, results are cached until its documents change.
+        `filters` restricts results by metadata, see metadata_conditions.
+        Projects on the "memory" retrieval backend are searched in process
+        (see vector_store) unless filtered or in hybrid mode.
+        """
+        config = config or {}
+        limit = limit or int(config.get("candidates", settings.RAG_CANDIDATES))
+        cache_key = None
+        if corpus_version is not None and settings.RETRIEVAL_CACHE_SIZE > 0:
+            relevant = {key: config[key] for key in _RETRIEVAL_CONFIG_KEYS if key in config}
+            cache_key = (
+                project_id, corpus_version, normalize_query(query), limit,
+                json.dumps(relevant, sort_keys=True), json.dumps(filters, sort_keys=True),
+            )
+            cached = self._results.get(cache_key)
+            if cached is not None:
+                return cached
+        # 1. Embed query (cached by normalized text)
+        if query_vector is None:
+            query_vector = await self.embed_query(query)
+
+        # 2. Search in DB using pgvector L2 distance
+        # Note: We filter by project_id to ensure multi-tenancy isolation
+        rows = None
+        if (
+            corpus_version is not None
+            and vector_store.is_enabled(config)
+            and not filters
+            and not config.get("metadata_filter")
+            and config.get("search_mode", settings.RAG_SEARCH_MODE) != "hybrid"
+        ):
+            # In-process exact search; None when the project is too large for it
+            rows = await vector_store.search(db, project_id, query_vector, limit, corpus_version)
+        if rows is None:
+            rows = await self.search(db, project_id, query_vector, limit, config, filters, query_text=query)
+        max_distance = float(config.get("max_distance", settings.RAG_MAX_DISTANCE))
+        if max_distance > 0:
+            # The best full-text matches are kept in hybrid mode, e.g. exact SKUs
+            keep_lexical = int(config.get("hybrid_keep_lexical", settings.RAG_HYBRID_KEEP_LEXICAL))
+            rows = [
+                row for row in rows
+                if row.distance <= max_distance or 0 < (getattr(row, "lexical_rank", None) or 0) <= keep_lexical
+            ]
+
         # 3. Format context
-        if not docs:
-            return ""
-            
-        context_parts = []
-        for doc in docs:
-            context_parts.append(f"---\n{doc.content}\n---")
-            
-        return "\n".join(context_parts)
+        context = ""
+        if rows:
+            budget = int(config.get("context_token_budget", settings.RAG_CONTEXT_TOKEN_BUDGET))
+            context_parts = [f"---\n{content}\n---" for content in pack_context(rows, budget)]
+            context = "\n".join(context_parts)
+        if cache_key is not None:
+            self._results.set(cache_key, context)
+        return context
+
+_LEXICAL_TERM = re.compile(r"\w+(?:[-.]\w+)*")
+
+def lexical_query_text(query: str) -> str:
+    """
+    websearch_to_tsquery text ORing the words of a question, so a chunk
+    matches on any of them instead of having to contain all of them.
+    Hyphenated or dotted codes (AB-123, v2.1) stay one term.
+    """
+    terms = dict.fromkeys(
+        term for term in _LEXICAL_TERM.findall(query.lower()) if term != "or"
+    )
+    return " or ".join(terms)
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text
+    return (len(text) + 3) // 4
+
+def _merged_content(first: dict, second: dict) -> Optional[str]:
+    """
+    Text of two groups joined at their overlap, `first` starting no later
+    than `second`, or None when their texts do not agree on the overlap:
+    offsets only describe the document they were recorded in, and the same
+    source can be ingested more than once (append mode, bulk uploads).
+    """
+    tail = first["content"][second["start"] - first["start"]:]
+    overlap = min(len(tail), len(second["content"]))
+    if not overlap or tail[:overlap] != second["content"][:overlap]:
+        return None
+    return first["content"] + second["content"][len(tail):]
+
+def _merge_neighbours(rows: List[Row]) -> List[dict]:
+    """
+    Merge ranked chunks whose character ranges overlap in the same source
+    (and page) and whose texts agree on the overlap, e.g. consecutive chunks
+    sharing the splitter overlap. Groups keep the best rank of their chunks.
+    """
+    groups: List[dict] = []
+    for rank, row in enumerate(rows):
+        metadata = row.metadata_ or {}
+        start = metadata.get("start_index")
+        group = {
+            "key": (metadata.get("source"), metadata.get("page")),
+            "start": start,
+            "end": start + len(row.content) if start is not None else None,
+            "content": row.content,
+            "rank": rank,
+        }
+        if start is None or group["key"][0] is None:
+            groups.append(group)
+            continue
+        # A merge can make the group overlap another one, so repeat
+        merged = True
+        while merged:
+            merged = False
+            for other in groups:
+                if not (
+                    other["key"] == group["key"] and other["start"] is not None
+                    and group["start"] < other["end"] and other["start"] < group["end"]
+                ):
+                    continue
+                first, second = (other, group) if other["start"] <= group["start"] else (group, other)
+                content = _merged_content(first, second)
+                if content is None:
+                    continue
+                groups.remove(other)
+                group = {
+                    "key": group["key"],
+                    "start": first["start"],
+                    "end": first["start"] + len(content),
+                    "content": content,
+                    "rank": min(first["rank"], second["rank"]),
+                }
+                merged = True
+                break
+        groups.append(group)
+    return sorted(groups, key=lambda g: g["rank"])
+
+def pack_context(rows: List[Row], token_budget: int) -> List[str]:
+    """
+    Merged chunk texts, best ranked first, that fit in token_budget. The best
+    chunk is always included, truncated if it alone exceeds the budget.
+    """
+    packed: List[str] = []
+    used = 0
+    for group in _merge_neighbours(rows):
+        tokens = estimate_tokens(group["content"])
+        if used + tokens <= token_budget:
+            packed.append(group["content"])
+            used += tokens
+        elif not packed:
+            packed.append(group["content"][:token_budget * 4])
+            used = token_budget
+    return packed
 
 rag_service = RAGService()
@@ -0,0 +1,328 @@
+"""
+In-process exact vector search over memory-mapped per-project files.
+
+Postgres stays the source of truth: a project's store is a copy of its
+document ids and embeddings, brought up to date from the documents table
+when ingestion commits or the project's corpus_version moves past it.
+New rows are appended; when rows were deleted a compacted generation is
+written. Files live in VECTOR_STORE_DIR/<project_id>/:
+
+    meta.json           {"corpus_version", "generation", "count", "dim"}
+    vectors-<gen>.f32   count x dim float32, row-major
+    ids-<gen>.bin       count x 16 bytes, document UUIDs
+
+Readers only look at the first `count` rows and meta.json is replaced
+atomically, so other worker processes never see a partial write. A
+compaction keeps the previous generation's files, and a reader that still
+misses its files reads meta.json again. Writers of a project are serialized
+with flock on its lock file.
+"""
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import shutil
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.all_models import Document, Project
+
+logger = logging.getLogger(__name__)
+
+# Embeddings fetched per query while bringing a store up to date
+_FETCH_BATCH_SIZE = 5000
+
+class StoreRow(NamedTuple):
+    id: uuid.UUID
+    content: str
+    metadata_: dict
+    distance: float
+
+class _Snapshot:
+    """
+    One loaded generation of a project's store.
+    """
+    def __init__(self, meta: dict, vectors: np.ndarray, ids: np.ndarray):
+        self.corpus_version = meta["corpus_version"]
+        self.vectors = vectors
+        self.ids = ids
+        # Squared norms, to get L2 distances from dot products
+        self.norms = np.einsum("ij,ij->i", vectors, vectors)
+
+    def top_k(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Positions and L2 distances of the k nearest rows, closest first.
+        """
+        k = min(k, len(self.norms))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # |v - q|^2 = |v|^2 - 2 v.q + |q|^2, the last term does not change the order
+        scores = self.norms - 2.0 * (self.vectors @ query)
+        positions = np.argpartition(scores, k - 1)[:k]
+        positions = positions[np.argsort(scores[positions])]
+        distances = np.sqrt(np.maximum(scores[positions] + float(query @ query), 0.0))
+        return positions, distances
+
+def _paths(directory: str, generation: int) -> Tuple[str, str]:
+    return (
+        os.path.join(directory, f"vectors-{generation}.f32"),
+        os.path.join(directory, f"ids-{generation}.bin"),
+    )
+
+def _read_meta(directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, "meta.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _write_meta(directory: str, meta: dict) -> None:
+    path = os.path.join(directory, "meta.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(path + ".tmp", path)
+
+def _read_ids(directory: str, meta: Optional[dict]) -> np.ndarray:
+    if not meta or not meta["count"]:
+        return np.empty((0, 16), dtype=np.uint8)
+    _, ids_path = _paths(directory, meta["generation"])
+    return np.fromfile(ids_path, dtype=np.uint8, count=meta["count"] * 16).reshape(-1, 16)
+
+# Attempts at loading a generation removed by compactions meanwhile
+_LOAD_ATTEMPTS = 3
+
+def _load(directory: str, meta: dict) -> _Snapshot:
+    count, dim = meta["count"], meta["dim"]
+    if not count:
+        return _Snapshot(meta, np.empty((0, dim), dtype=np.float32), np.empty((0, 16), dtype=np.uint8))
+    vectors_path, _ = _paths(directory, meta["generation"])
+    vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(count, dim))
+    return _Snapshot(meta, vectors, _read_ids(directory, meta))
+
+def _append(directory: str, meta: dict, ids: List[bytes], vectors: np.ndarray) -> dict:
+    vectors_path, ids_path = _paths(directory, meta["generation"])
+    # Truncate first: a failed append may have left bytes past `count`
+    for path, row_bytes, data in (
+        (vectors_path, meta["dim"] * 4, vectors.tobytes()),
+        (ids_path, 16, b"".join(ids)),
+    ):
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            f.truncate(meta["count"] * row_bytes)
+            f.seek(0, os.SEEK_END)
+            f.write(data)
+    return {**meta, "count": meta["count"] + len(ids)}
+
+def _write_generation(directory: str, meta: dict, ids: List[bytes], vectors: np.ndarray) -> None:
+    vectors_path, ids_path = _paths(directory, meta["generation"])
+    with open(vectors_path, "wb") as f:
+        f.write(vectors.tobytes())
+    with open(ids_path, "wb") as f:
+        f.write(b"".join(ids))
+    _write_meta(directory, meta)
+    # Readers that mapped an older generation keep it until they reload; the
+    # previous one stays for readers that just read the old meta.json
+    keep = {vectors_path, ids_path, *_paths(directory, meta["generation"] - 1)}
+    for path in glob.glob(os.path.join(directory, "*-*.*")):
+        if path not in keep:
+            os.remove(path)
+
+def _load_current(directory: str, meta: dict) -> Optional[_Snapshot]:
+    """
+    Load the generation described by meta, or the current one if a
+    compaction removed its files meanwhile. None if meta.json is gone.
+    """
+    for attempt in range(_LOAD_ATTEMPTS):
+        try:
+            return _load(directory, meta)
+        except FileNotFoundError:
+            if attempt == _LOAD_ATTEMPTS - 1:
+                raise
+            meta = _read_meta(directory)
+            if meta is None:
+                return None
+
+def _lock(directory: str) -> int:
+    fd = os.open(os.path.join(directory, "lock"), os.O_CREAT | os.O_RDWR)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    return fd
+
+def _unlock(fd: int) -> None:
+    fcntl.flock(fd, fcntl.LOCK_UN)
+    os.close(fd)
+
+class VectorStore:
+    def __init__(self):
+        # project_id -> loaded snapshot
+        self._snapshots: Dict[uuid.UUID, _Snapshot] = {}
+        # project_id -> corpus_version at which the project was too large
+        self._too_large: Dict[uuid.UUID, int] = {}
+        self._locks: Dict[uuid.UUID, asyncio.Lock] = {}
+
+    def is_enabled(self, config: Optional[dict]) -> bool:
+        """
+        Whether the project uses the in-process backend (rag_config "retrieval_backend").
+        """
+        return (config or {}).get("retrieval_backend", settings.RAG_RETRIEVAL_BACKEND) == "memory"
+
+    def _directory(self, project_id: uuid.UUID) -> str:
+        return os.path.join(settings.VECTOR_STORE_DIR, str(project_id))
+
+    async def search(
+        self,
+        db: AsyncSession,
+        project_id: uuid.UUID,
+        query_vector: List[float],
+        limit: int,
+        corpus_version: int,
+    ) -> Optional[List[StoreRow]]:
+        """
+        Exact nearest chunks as (id, content, metadata_, distance) rows,
+        closest first, or None when the project is over VECTOR_STORE_MAX_ROWS
+        and must be searched in Postgres. Content is fetched by primary key.
+        """
+        snapshot = await self._snapshot(db, project_id, corpus_version)
+        if snapshot is None:
+            return None
+        query = np.asarray(query_vector, dtype=np.float32)
+        positions, distances = await asyncio.to_thread(snapshot.top_k, query, limit)
+        ids = [uuid.UUID(bytes=snapshot.ids[position].tobytes()) for position in positions]
+        if not ids:
+            return []
+        result = await db.execute(
+            select(Document.id, Document.content, Document.metadata_).where(
+                Document.project_id == project_id,
+                Document.id.in_(ids),
+            )
+        )
+        found = {row.id: row for row in result.all()}
+        # Rows deleted after the snapshot was taken are skipped
+        return [
+            StoreRow(doc_id, found[doc_id].content, found[doc_id].metadata_, float(distance))
+            for doc_id, distance in zip(ids, distances)
+            if doc_id in found
+        ]
+
+    async def _snapshot(self, db: AsyncSession, project_id: uuid.UUID, corpus_version: int) -> Optional[_Snapshot]:
+        snapshot = self._snapshots.get(project_id)
+        if snapshot is not None and snapshot.corpus_version >= corpus_version:
+            return snapshot
+        if self._too_large.get(project_id, -1) >= corpus_version:
+            return None
+        async with self._locks.setdefault(project_id, asyncio.Lock()):
+            snapshot = self._snapshots.get(project_id)
+            if snapshot is not None and snapshot.corpus_version >= corpus_version:
+                return snapshot
+            directory = self._directory(project_id)
+            # Another worker may already have brought the files up to date
+            meta = await asyncio.to_thread(_read_meta, directory)
+            if meta is None or meta["corpus_version"] < corpus_version:
+                meta = await self.refresh(db, project_id)
+            if meta is None:
+                self._too_large[project_id] = corpus_version
+                self._snapshots.pop(project_id, None)
+                return None
+            snapshot = await asyncio.to_thread(_load_current, directory, meta)
+            if snapshot is None:
+                # Files removed, e.g. the project is being deleted
+                return None
+            self._snapshots[project_id] = snapshot
+            return snapshot
+
+    async def refresh(self, db: AsyncSession, project_id: uuid.UUID) -> Optional[dict]:
+        """
+        Bring the project's files up to date with the documents table:
+        append rows added since the last refresh, or write a compacted
+        generation when rows were deleted. Returns the new meta, or None when
+        the project is gone or has more than VECTOR_STORE_MAX_ROWS chunks.
+        """
+        # Read the version first: rows committed after it are only picked up again
+        corpus_version = (
+            await db.execute(select(Project.corpus_version).where(Project.id == project_id))
+        ).scalar()
+        if corpus_version is None:
+            return None
+        result = await db.execute(
+            select(Document.id).where(Document.project_id == project_id, Document.embedding.is_not(None))
+        )
+        current: Set[bytes] = {doc_id.bytes for doc_id in result.scalars()}
+        if len(current) > settings.VECTOR_STORE_MAX_ROWS:
+            logger.warning(f"Project {project_id} has {len(current)} chunks, over VECTOR_STORE_MAX_ROWS; using Postgres search")
+            return None
+
+        directory = self._directory(project_id)
+        await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+        fd = await asyncio.to_thread(_lock, directory)
+        try:
+            meta = _read_meta(directory)
+            if meta is not None and meta["corpus_version"] >= corpus_version:
+                return meta
+            dim = Document.embedding.type.dim
+            stored_ids = _read_ids(directory, meta)
+            stored = [row.tobytes() for row in stored_ids]
+            new_ids = list(current.difference(stored))
+            nothing_deleted = len(current) - len(new_ids) == len(stored)
+            # Rows deleted since `current` was read are left out
+            new_ids, new_vectors = await self._fetch_vectors(db, project_id, new_ids, dim)
+
+            if meta is not None and meta["dim"] == dim and nothing_deleted:
+                # Nothing was deleted, append in place
+                meta = await asyncio.to_thread(_append, directory, meta, new_ids, new_vectors)
+                meta["corpus_version"] = corpus_version
+                await asyncio.to_thread(_write_meta, directory, meta)
+            else:
+                keep = [position for position, doc_id in enumerate(stored) if doc_id in current]
+                if keep and meta["dim"] == dim:
+                    old = await asyncio.to_thread(_load, directory, meta)
+                    vectors = np.concatenate([np.asarray(old.vectors[keep]), new_vectors])
+                    ids = [stored[position] for position in keep] + new_ids
+                else:
+                    vectors, ids = new_vectors, new_ids
+                meta = {
+                    "corpus_version": corpus_version,
+                    "generation": (meta["generation"] + 1) if meta else 0,
+                    "count": len(ids),
+                    "dim": dim,
+                }
+                await asyncio.to_thread(_write_generation, directory, meta, ids, vectors)
+            logger.info(f"Vector store for project {project_id}: {meta['count']} rows, {len(new_ids)} added")
+            return meta
+        finally:
+            await asyncio.to_thread(_unlock, fd)
+
+    async def _fetch_vectors(
+        self, db: AsyncSession, project_id: uuid.UUID, ids: List[bytes], dim: int
+    ) -> Tuple[List[bytes], np.ndarray]:
+        """
+        The given documents that still exist and their embeddings, in order.
+        """
+        vectors = np.zeros((len(ids), dim), dtype=np.float32)
+        found = np.zeros(len(ids), dtype=bool)
+        for start in range(0, len(ids), _FETCH_BATCH_SIZE):
+            batch = ids[start:start + _FETCH_BATCH_SIZE]
+            positions = {doc_id: start + offset for offset, doc_id in enumerate(batch)}
+            result = await db.execute(
+                select(Document.id, Document.embedding).where(
+                    Document.project_id == project_id,
+                    Document.id.in_([uuid.UUID(bytes=doc_id) for doc_id in batch]),
+                )
+            )
+            for doc_id, embedding in result.all():
+                position = positions[doc_id.bytes]
+                vectors[position] = embedding
+                found[position] = True
+        return [doc_id for doc_id, ok in zip(ids, found) if ok], vectors[found]
+
+    async def drop(self, project_id: uuid.UUID) -> None:
+        """
+        Remove a deleted project's files.
+        """
+        self._snapshots.pop(project_id, None)
+        self._too_large.pop(project_id, None)
+        await asyncio.to_thread(shutil.rmtree, self._directory(project_id), ignore_errors=True)
+
+vector_store = VectorStore()
@@ -0,0 +1,77 @@
+"""
+Compare full-precision, halfvec and binary search on one project's chunks.
+
+For each mode, reports recall@k against exact search, average latency and
+the size of the index it uses. Modes whose index has not been built (see
+RAG_QUANTIZATION and `alembic upgrade head`) run as sequential scans, so
+their latency is not representative.
+
+    python -m scripts.benchmark_quantization <project_id> [--queries 100] [--k 8]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from sqlalchemy import func, select, text
+from app.db.session import AsyncSessionLocal
+from app.models.all_models import Document
+from app.services.rag_service import rag_service
+
+# Mode -> (rag_config overrides, index used)
+MODES = {
+    "full": ({"quantization": "none"}, "ix_documents_embedding_ann"),
+    "halfvec": ({"quantization": "halfvec"}, "ix_documents_embedding_halfvec"),
+    "binary": ({"quantization": "binary"}, "ix_documents_embedding_bit"),
+}
+
+async def index_size(db, name: str):
+    result = await db.execute(
+        text("SELECT pg_relation_size(to_regclass(:name))"), {"name": name}
+    )
+    return result.scalar()
+
+async def benchmark(project_id: uuid.UUID, queries: int, k: int, rerank_factor: int):
+    async with AsyncSessionLocal() as db:
+        # Stored embeddings of random chunks serve as queries
+        result = await db.execute(
+            select(Document.embedding)
+            .filter(Document.project_id == project_id)
+            .order_by(func.random())
+            .limit(queries)
+        )
+        vectors = [list(map(float, v)) for v in result.scalars().all()]
+        if not vectors:
+            print("Project has no chunks.")
+            return
+
+        exact = []
+        for vector in vectors:
+            rows = await rag_service.search(db, project_id, vector, k, {"exact_search_max_rows": 2 ** 62})
+            exact.append({row.id for row in rows})
+            await db.rollback()
+
+        print(f"{len(vectors)} queries, k={k}, rerank factor {rerank_factor}")
+        print(f"{'mode':<8} {'recall':>8} {'avg ms':>8} {'index MB':>10}")
+        for mode, (overrides, index) in MODES.items():
+            config = {**overrides, "exact_search_max_rows": 0, "rerank_factor": rerank_factor}
+            hits = 0
+            elapsed = 0.0
+            for vector, truth in zip(vectors, exact):
+                start = time.perf_counter()
+                rows = await rag_service.search(db, project_id, vector, k, config)
+                elapsed += time.perf_counter() - start
+                hits += len(truth & {row.id for row in rows})
+                await db.rollback()
+            size = await index_size(db, index)
+            recall = hits / max(1, sum(len(truth) for truth in exact))
+            size_text = f"{size / 2 ** 20:.1f}" if size is not None else "missing"
+            print(f"{mode:<8} {recall:>8.3f} {elapsed / len(vectors) * 1000:>8.2f} {size_text:>10}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("project_id", type=uuid.UUID)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.project_id, args.queries, args.k, args.rerank_factor))
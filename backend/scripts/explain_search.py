@@ -0,0 +1,65 @@
+"""
+Show the query plan of a project's retrieval search, optionally with
+metadata filters, and check that it does not scan documents of other projects.
+
+    python -m scripts.explain_search <project_id> "refund policy" --filters '{"source": "faq.md"}'
+
+Exits with status 1 when the plan sequentially scans documents outside the
+project's partition.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from app.db.session import AsyncSessionLocal
+from app.db.partitions import document_partition
+from app.core.config import settings
+from app.models.all_models import Project
+from app.services.rag_service import rag_service
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement, analyze: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    options = "ANALYZE, BUFFERS" if element.analyze else "COSTS"
+    return f"EXPLAIN ({options}) " + compiler.process(element.statement, **kw)
+
+async def explain(project_id: uuid.UUID, query: str, filters: dict, analyze: bool) -> bool:
+    async with AsyncSessionLocal() as db:
+        project = await db.get(Project, project_id)
+        if not project:
+            print("Project not found.")
+            return False
+        config = project.rag_config or {}
+        limit = int(config.get("candidates", settings.RAG_CANDIDATES))
+        query_vector = await rag_service.embed_query(query)
+        stmt = await rag_service.search_statement(db, project_id, query_vector, limit, config, filters)
+        result = await db.execute(Explain(stmt, analyze=analyze))
+        plan = [line for (line,) in result.all()]
+        await db.rollback()
+    print("\n".join(plan))
+    # Scanning the project's own partition is fine (exact search), any other is not
+    own_partition = document_partition(project_id)
+    if any("Seq Scan on documents" in line and own_partition not in line for line in plan):
+        print("\nWARNING: the plan scans documents beyond the project's partition; check that "
+              "the partition and the ix_documents_project_id, ix_documents_metadata and ANN indexes exist.")
+        return False
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("project_id", type=uuid.UUID)
+    parser.add_argument("query")
+    parser.add_argument("--filters", type=json.loads, default=None, help="JSON metadata filter")
+    parser.add_argument("--analyze", action="store_true", help="run the query (EXPLAIN ANALYZE)")
+    args = parser.parse_args()
+    ok = asyncio.run(explain(args.project_id, args.query, args.filters, args.analyze))
+    sys.exit(0 if ok else 1)
@@ -2,6 +2,7 @@ import asyncio
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import AsyncSessionLocal
+from app.db.partitions import create_document_partition
 from app.models.all_models import Project
 from app.services.ingestion_service import ingestion_service
 
@@ -21,6 +22,8 @@ async def seed_data():
                 system_prompt="You are a friendly support assistant for the Demo Company."
             )
             db.add(project)
+            await db.flush()
+            await create_document_partition(db, project_id)
             await db.commit()
         else:
             print(f"Project {project_id} already exists.")
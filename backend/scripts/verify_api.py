@@ -3,6 +3,7 @@ import json
 import asyncio
 import websockets
 import sys
+import time
 import uuid
 
 BASE_URL = "http://127.0.0.1:8000/api/v1"
@@ -38,7 +39,18 @@ def ingest_knowledge(project_id, api_key):
     try:
         response = requests.post(f"{BASE_URL}/ingest/{project_id}/text", json=payload, headers=headers)
         response.raise_for_status()
-        print(f"   Success! {response.json()['message']}")
+        job = response.json()
+        print(f"   {job['message']} (job {job['job_id']})")
+        # Ingestion runs in the background; wait for the job to finish
+        for _ in range(60):
+            status = requests.get(f"{BASE_URL}/ingest/jobs/{job['job_id']}", headers=headers).json()
+            if status["status"] in ("completed", "failed"):
+                break
+            time.sleep(1)
+        if status["status"] != "completed":
+            print(f"   Ingestion job did not complete: {status}")
+            sys.exit(1)
+        print(f"   Success! {status['chunks_inserted']} chunks ingested")
     except Exception as e:
         print(f"   Error ingesting knowledge: {e}")
         if hasattr(e, 'response') and e.response:
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.services.rag_service import lexical_query_text
+
+QUESTION = "What is the price of the AB-123 widget?"
+CHUNK = "Catalogue entry AB-123: steel bracket, 40 mm, pack of ten."
+
+
+def test_lexical_query_text_ors_terms():
+    assert lexical_query_text(QUESTION) == (
+        "what or is or the or price or of or ab-123 or widget"
+    )
+
+
+def test_lexical_query_text_drops_operators():
+    assert lexical_query_text('-foo "bar" OR baz or foo') == "foo or bar or baz"
+
+
+def test_question_finds_chunk_by_sku():
+    async def matches() -> bool:
+        engine = create_async_engine(settings.DATABASE_URL)
+        try:
+            async with engine.connect() as conn:
+                return await conn.scalar(
+                    text(
+                        "SELECT to_tsvector('english', :chunk) "
+                        "@@ websearch_to_tsquery('english', :query)"
+                    ),
+                    {"chunk": CHUNK, "query": lexical_query_text(QUESTION)},
+                )
+        finally:
+            await engine.dispose()
+
+    try:
+        assert asyncio.run(asyncio.wait_for(matches(), timeout=5))
+    except (OSError, asyncio.TimeoutError) as exc:
+        pytest.skip(f"Postgres unavailable: {exc}")
@@ -28,8 +28,9 @@ export interface Project {
 }
 
 export interface IngestResponse {
+  job_id: string;
+  status: string;
   message: string;
-  document_id: string;
 }
 
 export interface OverviewMetrics {
@@ -141,7 +141,7 @@ onMounted(() => {
     setIngestStatus(null);
     try {
       await api.ingestText(project.id, project.api_key, ingestText);
-      setIngestStatus({ type: 'success', message: 'Knowledge successfully added!' });
+      setIngestStatus({ type: 'success', message: 'Knowledge queued for ingestion!' });
       setIngestText('');
     } catch (err: unknown) {
       const message = err instanceof Error ? err.message : 'Failed to ingest text';